@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+# Same as katello-errata daemon, without installing the package
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/modules')
+from katelloerrata.cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main(['daemon'] + sys.argv[1:]))
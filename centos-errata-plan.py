@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+# Same as katello-errata plan|apply, without installing the package
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/modules')
+from katelloerrata.cli import main
+
+
+PLAN_COMMANDS = ('plan', 'apply')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in PLAN_COMMANDS:
+        sys.exit('usage: %s {%s} ...' % (os.path.basename(sys.argv[0]), ','.join(PLAN_COMMANDS)))
+    sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,6 @@
 #!/bin/bash
 
-CURDIR=$(pwd)
-
-cd ${CURDIR}/data
-wget -N http://cefs.steve-meier.de/errata.latest.xml
-wget -N https://www.redhat.com/security/data/oval/com.redhat.rhsa-all.xml
-cd ${CURDIR}
+# Download the errata and OVAL files into the data directory, only when they
+# changed upstream. The compressed files are kept as is: the loader
+# decompresses them on the fly.
+exec "$(dirname "$0")/centos-errata-download.py" "$@"
@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+
+import bz2
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape, quoteattr
+
+from .download import FeedDownloader
+from .importer import run_import
+from .inventory import InventoryCache
+from .katello import Katello
+from .loader import load_feeds
+from .metrics import Metrics
+from .pulp import Pulp
+from .sqlite_store import SqliteErrataStore
+from .store import RedisErrataStore
+
+OS_RELEASES = (6, 7)
+ERRATA_TYPES = (
+    ('CESA', 'Security Advisory'),
+    ('CEBA', 'Bug Fix Advisory'),
+    ('CEEA', 'Product Enhancement Advisory'),
+)
+# Target of the median startup time of a load with unchanged data files, in seconds
+STARTUP_TARGET = 0.3
+
+
+#####################
+# Synthetic feeds   #
+#####################
+
+def errata_packages(index, nb_packages):
+    """
+    Returns the os release and the package filenames of the synthetic errata number index
+    """
+    os_release = OS_RELEASES[index % len(OS_RELEASES)]
+    packages = ['bench%d-%d-1.%d-1.el%d.x86_64.rpm' % (index, i, index, os_release) for i in range(nb_packages)]
+    return os_release, packages
+
+
+def errata_id(index):
+    prefix = ERRATA_TYPES[index % len(ERRATA_TYPES)][0]
+    return '%s-%d:%04d' % (prefix, 2000 + index // 10000, index % 10000)
+
+
+def generate_errata_feed(file_name, nb_errata, nb_packages):
+    """
+    Writes a synthetic errata.latest.xml of nb_errata errata, with
+    nb_packages binary packages and one source package each
+    """
+    with open(file_name, 'w') as fh:
+        fh.write('<opt>\n<meta><script_version_required>20230101</script_version_required></meta>\n')
+        for index in range(nb_errata):
+            os_release, packages = errata_packages(index, nb_packages)
+            tag = errata_id(index).replace(':', '--')
+            errata_type = ERRATA_TYPES[index % len(ERRATA_TYPES)][1]
+            fh.write('<%s from="centos-announce@centos.org" issue_date="2020-01-01 00:00:00" references=%s release="1" severity="Moderate" synopsis=%s type=%s>\n' % (
+                tag,
+                quoteattr('https://lists.centos.org/pipermail/centos-announce/%d.html' % index),
+                quoteattr('CentOS %d bench%d Update' % (os_release, index)),
+                quoteattr(errata_type),
+            ))
+            fh.write('<os_arch>x86_64</os_arch>\n<os_release>%d</os_release>\n' % os_release)
+            for package in packages:
+                fh.write('<packages>%s</packages>\n' % escape(package))
+            fh.write('<packages>bench%d-1.%d-1.el%d.src.rpm</packages>\n' % (index, index, os_release))
+            fh.write('</%s>\n' % tag)
+        fh.write('</opt>\n')
+
+
+def generate_oval_feed(file_name, nb_errata):
+    """
+    Writes a synthetic OVAL file with a definition for every security
+    errata of the synthetic errata feed
+    """
+    with open(file_name, 'w') as fh:
+        fh.write('<oval_definitions xmlns="http://oval.mitre.org/XMLSchema/oval-definitions-5"><definitions>\n')
+        for index in range(0, nb_errata, len(ERRATA_TYPES)):
+            fh.write('<definition class="patch" id="oval:com.redhat.rhsa:def:%d%04d" version="1"><metadata>'
+                     '<title>RHSA-%d:%04d</title><description>Description of bench%d</description>'
+                     '<advisory><severity>Moderate</severity><cve>CVE-2020-%04d</cve></advisory>'
+                     '</metadata></definition>\n' % (2000 + index // 10000, index % 10000, 2000 + index // 10000, index % 10000, index, index % 10000))
+        fh.write('</definitions></oval_definitions>\n')
+
+
+#####################
+# In-process Redis  #
+#####################
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+class FakeRedis(object):
+
+    """In-process stand-in of the redis client, for the commands used by RedisErrataStore"""
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.sets = {}
+        self.commands = 0
+
+    def get(self, key):
+        self.commands += 1
+        return self.values.get(_to_bytes(key))
+
+    def set(self, key, value):
+        self.commands += 1
+        self.values[_to_bytes(key)] = _to_bytes(value)
+
+    def mget(self, keys):
+        self.commands += 1
+        return [self.values.get(_to_bytes(key)) for key in keys]
+
+    def mset(self, mapping):
+        self.commands += 1
+        for key, value in mapping.items():
+            self.values[_to_bytes(key)] = _to_bytes(value)
+
+    def exists(self, key):
+        self.commands += 1
+        return int(_to_bytes(key) in self.values)
+
+    def delete(self, key):
+        self.commands += 1
+        key = _to_bytes(key)
+        for data in (self.values, self.hashes, self.sets):
+            data.pop(key, None)
+
+    def hmget(self, name, keys):
+        self.commands += 1
+        data = self.hashes.get(_to_bytes(name), {})
+        return [data.get(_to_bytes(key)) for key in keys]
+
+    def hset(self, name, mapping):
+        self.commands += 1
+        data = self.hashes.setdefault(_to_bytes(name), {})
+        for key, value in mapping.items():
+            data[_to_bytes(key)] = _to_bytes(value)
+
+    def hgetall(self, name):
+        self.commands += 1
+        return dict(self.hashes.get(_to_bytes(name), {}))
+
+    def hdel(self, name, *keys):
+        self.commands += 1
+        data = self.hashes.get(_to_bytes(name), {})
+        for key in keys:
+            data.pop(_to_bytes(key), None)
+
+    def sadd(self, name, *values):
+        self.commands += 1
+        self.sets.setdefault(_to_bytes(name), set()).update(_to_bytes(value) for value in values)
+
+    def srem(self, name, *values):
+        self.commands += 1
+        self.sets.get(_to_bytes(name), set()).difference_update(_to_bytes(value) for value in values)
+
+    def smembers(self, name):
+        self.commands += 1
+        return set(self.sets.get(_to_bytes(name), set()))
+
+    def sunion(self, names):
+        self.commands += 1
+        result = set()
+        for name in names:
+            result.update(self.sets.get(_to_bytes(name), set()))
+        return result
+
+    def scan(self, cursor, match='*', count=10):
+        self.commands += 1
+        keys = sorted(self.values)
+        matching = [key for key in keys[cursor:cursor + count] if fnmatch.fnmatchcase(key.decode('utf-8'), match)]
+        cursor += count
+        return (cursor if cursor < len(keys) else 0), matching
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+
+    """Queues the commands, and runs them on execute()"""
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+###############################
+# Fake Katello and Pulp APIs  #
+###############################
+
+class FakeKatelloHandler(BaseHTTPRequestHandler):
+
+    """Answers the Katello and Pulp API calls made by the importer"""
+    # Keep the connections alive, as Katello does
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats['bytes_sent'] += len(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send_page(self, results, params):
+        per_page = int(params.get('per_page', ['20'])[0])
+        page = int(params.get('page', ['1'])[0])
+        self._send_json({
+            'total': len(results),
+            'subtotal': len(results),
+            'page': page,
+            'per_page': per_page,
+            'results': results[(page - 1) * per_page:page * per_page],
+        })
+
+    def do_GET(self):
+        self.server.stats['api_calls'] += 1
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        params.update(parse_qs(self._read_body().decode('utf-8')))
+        repositories = self.server.repositories
+
+        if url.path == '/katello/api/v2/repositories':
+            return self._send_page([{'id': repo['id'], 'label': repo['label']} for repo in repositories.values()], params)
+        match_obj = re.match(r'^/katello/api/v2/repositories/(\d+)$', url.path)
+        if match_obj:
+            repo = repositories[int(match_obj.group(1))]
+            return self._send_json({'id': repo['id'], 'label': repo['label'], 'checksum_type': 'sha256',
+                                    'last_sync': {'ended_at': '2020-01-01 00:00:00 UTC'},
+                                    'content_counts': {'rpm': len(repo['packages'])}})
+        if url.path == '/katello/api/v2/errata':
+            return self._send_page([], params)
+        if url.path == '/katello/api/v2/packages':
+            repo = repositories[int(params['repository_id'][0])]
+            return self._send_page(repo['packages'], params)
+        if url.path == '/pulp/api/v3/repositories/rpm/rpm/':
+            return self._send_json({'results': [{'pulp_href': '/pulp/api/v3/repositories/rpm/rpm/%s/' % params['name'][0]}]})
+        if url.path.startswith('/foreman_tasks/api/tasks/'):
+            return self._send_json({'id': url.path.rsplit('/', 1)[1], 'state': 'stopped', 'result': 'success'})
+        if url.path.startswith('/pulp/api/v3/tasks/'):
+            return self._send_json({'pulp_href': url.path, 'state': 'completed', 'error': None})
+        self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        self.server.stats['api_calls'] += 1
+        self.server.stats['bytes_received'] += len(self._read_body())
+        url = urlsplit(self.path)
+        if url.path == '/pulp/api/v3/content/rpm/advisories/':
+            with self.server.lock:
+                self.server.stats['advisories'] += 1
+                task_id = self.server.stats['advisories']
+            return self._send_json({'task': '/pulp/api/v3/tasks/%d/' % task_id}, 202)
+        match_obj = re.match(r'^/katello/api/v2/repositories/(\d+)/sync$', url.path)
+        if match_obj:
+            return self._send_json({'id': 'sync-%s' % match_obj.group(1), 'started_at': '2020-01-01 00:00:00 UTC', 'state': 'planned'}, 202)
+        self._send_json({'error': 'not found'}, 404)
+
+
+def fake_repositories(nb_errata, nb_packages, nb_repositories, nb_repository_packages):
+    """
+    Returns the synthetic Katello repositories, keyed by ID. The packages of
+    the synthetic errata are spread over the repositories of their os release,
+    which are then filled up to nb_repository_packages packages.
+    """
+    repositories = {}
+    for index in range(nb_repositories):
+        os_release = OS_RELEASES[index % len(OS_RELEASES)]
+        repositories[index + 1] = {'id': index + 1, 'label': 'bench-el%d-%d' % (os_release, index), 'os_release': os_release, 'packages': []}
+    repositories_by_release = {}
+    for repo in repositories.values():
+        repositories_by_release.setdefault(repo['os_release'], []).append(repo)
+
+    def add_package(repo, filename):
+        name, version, release, arch = re.match(r'^(.+)-([^-]+)-([^-]+)\.([^.]+)\.rpm$', filename).groups()
+        repo['packages'].append({
+            'name': name, 'version': version, 'release': release, 'epoch': '0', 'arch': arch,
+            'checksum': '%064d' % len(repo['packages']), 'filename': filename,
+            'nvra': filename[:-4], 'nvrea': filename[:-4],
+        })
+
+    for index in range(nb_errata):
+        os_release, packages = errata_packages(index, nb_packages)
+        if os_release not in repositories_by_release:
+            continue
+        repo = repositories_by_release[os_release][index % len(repositories_by_release[os_release])]
+        if len(repo['packages']) + len(packages) <= nb_repository_packages:
+            for package in packages:
+                add_package(repo, package)
+    for repo in repositories.values():
+        while len(repo['packages']) < nb_repository_packages:
+            add_package(repo, 'filler%d-1.0-1.el%d.x86_64.rpm' % (len(repo['packages']), repo['os_release']))
+    return repositories
+
+
+class FakeKatelloServer(object):
+
+    """Local HTTP server answering the Katello and Pulp API calls"""
+    def __init__(self, repositories, handler=FakeKatelloHandler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.repositories = repositories
+        self.httpd.lock = threading.Lock()
+        self.httpd.stats = {'api_calls': 0, 'bytes_sent': 0, 'bytes_received': 0, 'advisories': 0}
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+
+class FakeFeedHandler(BaseHTTPRequestHandler):
+
+    """Serves the files of a directory, with ETag and Last-Modified validators"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.stats['requests'] += 1
+        file_name = os.path.join(self.server.directory, os.path.basename(urlsplit(self.path).path))
+        if not os.path.isfile(file_name):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        stat = os.stat(file_name)
+        etag = '"%x-%x"' % (stat.st_size, stat.st_mtime_ns)
+        if self.headers.get('If-None-Match') == etag:
+            self.server.stats['not_modified'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        with open(file_name, 'rb') as fh:
+            body = fh.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(stat.st_mtime, usegmt=True))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats['bytes_sent'] += len(body)
+
+
+class FakeFeedServer(FakeKatelloServer):
+
+    """Local HTTP server publishing the feeds of a directory"""
+    def __init__(self, directory, handler=FakeFeedHandler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.directory = directory
+        self.httpd.stats = {'requests': 0, 'not_modified': 0, 'bytes_sent': 0}
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+
+def publish_feeds(directory, file_names):
+    """
+    Publishes bz2 compressed copies of file_names in directory,
+    with a sha1sum file of the uncompressed feeds
+    """
+    checksums = []
+    for file_name in file_names:
+        with open(file_name, 'rb') as fh, bz2.open(os.path.join(directory, os.path.basename(file_name) + '.bz2'), 'wb') as bz2_fh:
+            data = fh.read()
+            bz2_fh.write(data)
+        checksums.append('%s  %s\n' % (hashlib.sha1(data).hexdigest(), os.path.basename(file_name)))
+    with open(os.path.join(directory, 'SHA1SUMS'), 'w') as fh:
+        fh.writelines(checksums)
+
+
+#############
+# Benchmark #
+#############
+
+class StageTimer(object):
+
+    """Records the wall time of the benchmark stages"""
+    def __init__(self):
+        self.stages = {}
+
+    def time(self, stage):
+        timer = self
+
+        class _Stage(object):
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *args):
+                timer.stages[stage] = round(time.perf_counter() - self.start, 6)
+        return _Stage()
+
+    def add(self, stage, metrics):
+        """
+        Records the stages timed by a command in its Metrics, as sub-stages of stage
+        """
+        for name, duration in metrics.stages.items():
+            self.stages['%s.%s' % (stage, name)] = round(duration, 6)
+
+
+def run_benchmark(work_dir, nb_errata=1000, nb_packages=4, nb_repositories=2, nb_repository_packages=2000,
+                  batch_size=500, workers=4, backend='redis', loader_workers=1):
+    """
+    Runs the loader and importer stages against synthetic feeds, an in-process
+    Redis or a SQLite database (backend) and a local fake Katello/Pulp server,
+    and returns the timings and counters as a dictionary. With several
+    loader_workers, the feeds are also loaded by the pool of processes, in
+    another store.
+    """
+    timer = StageTimer()
+    redis_client = FakeRedis()
+
+    def open_store(name='errata', client=redis_client):
+        if backend == 'sqlite':
+            return SqliteErrataStore(os.path.join(work_dir, '%s.sqlite' % name), batch_size)
+        return RedisErrataStore(client, batch_size)
+
+    errata_file = os.path.join(work_dir, 'errata.latest.xml')
+    oval_file = os.path.join(work_dir, 'com.redhat.rhsa-all.xml')
+
+    with timer.time('generate'):
+        generate_errata_feed(errata_file, nb_errata, nb_packages)
+        generate_oval_feed(oval_file, nb_errata)
+        repositories = fake_repositories(nb_errata, nb_packages, nb_repositories, nb_repository_packages)
+
+    # Download, then revalidation of the unchanged feeds
+    publish_dir = os.path.join(work_dir, 'publish')
+    download_dir = os.path.join(work_dir, 'download')
+    os.mkdir(publish_dir)
+    os.mkdir(download_dir)
+    publish_feeds(publish_dir, (errata_file, oval_file))
+    with FakeFeedServer(publish_dir) as server:
+        downloader = FeedDownloader({'retries': 0})
+        for stage in ('download', 'download.not_modified'):
+            with timer.time(stage):
+                for file_name in (errata_file, oval_file):
+                    downloader.download('%s/%s' % (server.url, os.path.basename(file_name)),
+                                        os.path.join(download_dir, os.path.basename(file_name)), server.url + '/SHA1SUMS')
+        download_stats = dict(server.stats)
+
+    # Loader: the load command, then a load of the same feeds, which has nothing to do
+    store = open_store()
+    loader_metrics = Metrics('loader')
+    with timer.time('loader'):
+        load_feeds(store, errata_file, oval_file, loader_metrics)
+    timer.add('loader', loader_metrics)
+    with timer.time('loader.unchanged'):
+        load_feeds(store, errata_file, oval_file, Metrics('loader'))
+    digests = store.get_digests([errata.errata_id for errata in store.iter_errata()])
+
+    # Loader, with a pool of processes
+    nb_parallel_different = None
+    if loader_workers > 1:
+        parallel_store = open_store('errata-parallel', FakeRedis())
+        parallel_metrics = Metrics('loader')
+        with timer.time('loader.parallel'):
+            load_feeds(parallel_store, errata_file, oval_file, parallel_metrics, loader_workers)
+        timer.add('loader.parallel', parallel_metrics)
+        parallel_digests = parallel_store.get_digests(list(digests))
+        nb_parallel_different = sum(1 for errata_id in digests if parallel_digests.get(errata_id) != digests[errata_id])
+
+    # Importer: the import command, then a steady state import, with nothing
+    # left to upload. Each one is a new run, as from cron.
+    with FakeKatelloServer(repositories) as server:
+        conf_data = {
+            'katello': {'server': server.url, 'api_url': '/katello/api/v2/', 'username': 'admin', 'password': 'admin',
+                        'ssl_verify': False, 'workers': workers},
+            'pulp': {'server': server.url, 'ssl_verify': False, 'workers': workers, 'backoff': 0},
+            'repositories': dict((repo['label'], {'os_release': repo['os_release'], 'pulp_id': repo['label']}) for repo in repositories.values()),
+        }
+        runs = {}
+        for stage, full in (('importer', True), ('importer.delta', False)):
+            metrics = Metrics('importer')
+            store = open_store()
+            katello = Katello({'conf_data': conf_data, 'metrics': metrics})
+            pulp = Pulp({'conf_data': conf_data, 'metrics': metrics})
+            inventory_cache = InventoryCache(os.path.join(work_dir, 'inventory'))
+            with timer.time(stage):
+                run_import(store, katello, pulp, conf_data, metrics, full=full, inventory_cache=inventory_cache)
+            timer.add(stage, metrics)
+            runs[stage] = metrics.counters
+        api_stats = dict(server.stats)
+
+    return {
+        'parameters': {
+            'errata': nb_errata,
+            'packages_per_errata': nb_packages,
+            'repositories': nb_repositories,
+            'packages_per_repository': nb_repository_packages,
+            'batch_size': batch_size,
+            'workers': workers,
+            'backend': backend,
+            'loader_workers': loader_workers,
+        },
+        'stages': timer.stages,
+        'counters': {
+            'oval_definitions': loader_metrics.counters['oval_definitions'],
+            'errata_loaded': loader_metrics.counters['errata_new'],
+            'loader_store_round_trips': loader_metrics.counters['store_round_trips'],
+            'loader_parallel_different': nb_parallel_different,
+            'importer_store_round_trips': runs['importer']['store_round_trips'],
+            'errata_read': runs['importer']['errata_processed'],
+            'errata_matched': runs['importer']['errata_matched'],
+            'errata_uploaded': runs['importer']['errata_uploaded'],
+            'errata_failed': runs['importer']['errata_failed'],
+            'errata_timed_out': runs['importer']['errata_timed_out'],
+            'repositories_synced': runs['importer']['repositories_synced'],
+            'errata_read_delta': runs['importer.delta']['errata_processed'],
+            'errata_uploaded_delta': runs['importer.delta']['errata_uploaded'],
+            'inventory_cache_hits': runs['importer.delta']['inventory_cache_hits'],
+            'api_calls': api_stats['api_calls'],
+            'api_bytes_sent': api_stats['bytes_sent'],
+            'api_bytes_received': api_stats['bytes_received'],
+            'download_bytes': download_stats['bytes_sent'],
+            'download_not_modified': download_stats['not_modified'],
+        },
+    }
+
+
+def measure_startup(work_dir, runs=5, target=STARTUP_TARGET, nb_errata=1000):
+    """
+    Measures the median wall time of katello-errata --help, and of a load
+    of data files already loaded in a SQLite store, the no-op path, each run
+    in a new process. Returns the timings, the target, and whether the
+    no-op load met it.
+    """
+    errata_file = os.path.join(work_dir, 'errata.latest.xml')
+    oval_file = os.path.join(work_dir, 'com.redhat.rhsa-all.xml')
+    generate_errata_feed(errata_file, nb_errata, 4)
+    generate_oval_feed(oval_file, nb_errata)
+    # JSON is valid YAML
+    config_file = os.path.join(work_dir, 'config.yaml')
+    with open(config_file, 'w') as fh:
+        json.dump({
+            'store': {'backend': 'sqlite'},
+            'sqlite': {'path': os.path.join(work_dir, 'errata.sqlite')},
+            'data_files': {'errata_files': errata_file, 'oval_files': oval_file},
+        }, fh)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+                                        [path for path in [env.get('PYTHONPATH')] if path])
+    commands = {
+        'startup.help': [sys.executable, '-m', 'katelloerrata', '--help'],
+        'startup.load_noop': [sys.executable, '-m', 'katelloerrata', '--config', config_file, 'load'],
+    }
+    # The first load fills the store
+    subprocess.run(commands['startup.load_noop'], env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    stages = {}
+    for stage, command in sorted(commands.items()):
+        durations = []
+        for i in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            durations.append(time.perf_counter() - start)
+        stages[stage] = round(statistics.median(durations), 6)
+    return {
+        'parameters': {
+            'errata': nb_errata,
+            'runs': runs,
+        },
+        'stages': stages,
+        'target': target,
+        'target_met': stages['startup.load_noop'] <= target,
+    }
+
+
+if __name__ == '__main__':
+    print("Benchmark functions for python")
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+# The heavy dependencies (lxml, redis, requests) are only imported by the
+# subcommands using them, so that the no-op runs start fast
+
+import argparse
+import logging
+import sys
+
+from .metrics import Metrics, add_arguments, enable_profiling
+
+DEFAULT_CONFIG = 'config.yaml'
+
+logger = logging.getLogger(__name__)
+
+
+def read_config(file_name):
+    """
+    Returns the content of the configuration file
+    """
+    try:
+        from yaml import load
+    except ImportError:
+        print("Please install the PyYAML module.")
+        sys.exit(-1)
+    try:
+        from yaml import CLoader as Loader
+    except ImportError:
+        from yaml import Loader
+
+    with open(file_name, 'r') as yaml_file:
+        return load(yaml_file, Loader=Loader)
+
+
+def setup_logging(debug):
+    # Create the logger object
+    root_logger = logging.getLogger()
+    # Set logger level to INFO, or DEBUG with --debug
+    log_level = logging.DEBUG if debug else logging.INFO
+    root_logger.setLevel(log_level)
+
+    # Create a formatter object
+    formatter = logging.Formatter('%(asctime)s :: %(levelname)s :: %(message)s')
+
+    # Console handler
+    steam_handler = logging.StreamHandler()
+    steam_handler.setFormatter(formatter)
+    steam_handler.setLevel(log_level)
+    root_logger.addHandler(steam_handler)
+
+
+def start_metrics(args, job):
+    metrics = Metrics(job)
+    metrics.write_on_exit(args.metrics_textfile, args.metrics_json)
+    return metrics
+
+
+def get_inventory_cache(conf_data, refresh, read_only=False):
+    """
+    Returns the cache of the repositories package lists configured in the
+    katello section, or None
+    """
+    if not conf_data['katello'].get('inventory_cache'):
+        return None
+    from .inventory import InventoryCache
+    return InventoryCache(conf_data['katello']['inventory_cache'], refresh=refresh, read_only=read_only)
+
+
+def command_download(args, conf_data):
+    try:
+        import requests
+    except ImportError:
+        print("Please install the python-requests module.")
+        sys.exit(-1)
+    from .download import FeedDownloader, ChecksumError, DEFAULT_ERRATA_URL, DEFAULT_OVAL_URL
+
+    metrics = start_metrics(args, 'download')
+    conf_download = conf_data.get('download') or {}
+    downloader = FeedDownloader(dict(conf_download, metrics=metrics))
+    feeds = (
+        ('errata', conf_download.get('errata_url', DEFAULT_ERRATA_URL), conf_download.get('errata_checksum_url'), conf_data['data_files']['errata_files']),
+        ('oval', conf_download.get('oval_url', DEFAULT_OVAL_URL), conf_download.get('oval_checksum_url'), conf_data['data_files']['oval_files']),
+    )
+
+    failed = False
+    for name, url, checksum_url, file_name in feeds:
+        try:
+            with metrics.stage(name):
+                result = downloader.download(url, file_name, checksum_url)
+        except (ChecksumError, requests.exceptions.RequestException) as e:
+            logger.error('Download of %s failed: %s', url, e)
+            metrics.incr('download_failed')
+            failed = True
+            continue
+        metrics.incr('download_%s' % result['status'])
+    return 1 if failed else 0
+
+
+def command_load(args, conf_data):
+    from .feeds import find_feed
+    from .loader import load_feeds, DEFAULT_WORKERS
+    from .store import open_store
+
+    metrics = start_metrics(args, 'loader')
+    workers = args.workers
+    if workers is None:
+        workers = (conf_data.get('loader') or {}).get('workers', DEFAULT_WORKERS)
+
+    # The feeds may have been downloaded compressed: they are then
+    # decompressed on the fly by the parser
+    errata_file = find_feed(conf_data['data_files']['errata_files'])
+    oval_file = find_feed(conf_data['data_files']['oval_files'])
+
+    store = open_store(conf_data)
+    load_feeds(store, errata_file, oval_file, metrics, workers)
+    return 0
+
+
+def command_import(args, conf_data):
+    from .importer import run_import
+    from .katello import Katello
+    from .pulp import Pulp
+    from .store import open_store
+
+    metrics = start_metrics(args, 'importer')
+    store = open_store(conf_data)
+    # The configuration is parsed once, and shared with the Katello and Pulp objects
+    katello = Katello({'conf_data': conf_data, 'metrics': metrics})
+    pulp = Pulp({'conf_data': conf_data, 'metrics': metrics})
+    # The package inventories of the repositories unchanged since the last run are read from the cache
+    inventory_cache = get_inventory_cache(conf_data, args.full)
+
+    try:
+        syncs = run_import(store, katello, pulp, conf_data, metrics, args.full, args.changed_only, inventory_cache)
+    except LookupError as e:
+        logger.info(str(e))
+        return 1
+
+    # Exit with an error if a synchronization failed
+    if not all(sync['success'] for sync in syncs):
+        return 1
+    return 0
+
+
+def command_sync(args, conf_data):
+    from .importer import get_repositories, sync_repositories
+    from .katello import Katello
+
+    metrics = start_metrics(args, 'sync')
+    katello = Katello({'conf_data': conf_data, 'metrics': metrics})
+    conf_repositories = conf_data['repositories']
+    if args.repository:
+        unknown = [label for label in args.repository if label not in conf_repositories]
+        if unknown:
+            logger.error('Repository(ies) %s not in the configuration file', ', '.join(unknown))
+            return 1
+        conf_repositories = dict((label, conf_repositories[label]) for label in args.repository)
+
+    try:
+        with metrics.stage('repositories'):
+            all_repositories = get_repositories(katello, conf_repositories)
+    except LookupError as e:
+        logger.info(str(e))
+        return 1
+    with metrics.stage('sync'):
+        syncs = sync_repositories(katello, all_repositories, force=True)
+
+    failed = False
+    for sync in syncs:
+        if sync['success']:
+            logger.info("Synchronization of %s finished in %.1fs, task id: %s, state: %s, result: %s",
+                        sync['repository_label'], sync['duration'], sync['task_id'], sync['state'], sync['result'])
+        else:
+            failed = True
+            logger.error("Synchronization of %s failed after %.1fs, task id: %s, state: %s, result: %s: %s",
+                         sync['repository_label'], sync['duration'], sync['task_id'], sync['state'], sync['result'], sync['error'])
+    return 1 if failed else 0
+
+
+def command_plan(args, conf_data):
+    from .katello import Katello
+    from .plan import build_plan, write_plan
+    from .store import open_store
+
+    metrics = start_metrics(args, 'plan')
+    # Planning writes nothing but the plan: the store and the inventory cache are only read
+    store = open_store(conf_data, read_only=True)
+    katello = Katello({'conf_data': conf_data, 'metrics': metrics})
+    inventory_cache = get_inventory_cache(conf_data, args.full, read_only=True)
+    try:
+        plan = build_plan(store, katello, conf_data, metrics, inventory_cache)
+    except LookupError as e:
+        logger.info(str(e))
+        return 1
+    write_plan(plan, args.output)
+    logger.info('%d errata planned in %d repositories, written to %s', len(plan['advisories']), len(plan['repositories']), args.output)
+    return 0
+
+
+def command_apply(args, conf_data):
+    from .plan import read_plan, get_targets, apply_plan_targets
+
+    metrics = start_metrics(args, 'apply')
+    plan = read_plan(args.plan)
+    targets = get_targets(conf_data)
+    if args.target:
+        unknown = [target for target in args.target if target not in targets]
+        if unknown:
+            logger.error('Unknown target(s) %s', ', '.join(unknown))
+            return 1
+        targets = dict((target, targets[target]) for target in args.target)
+
+    try:
+        summaries = apply_plan_targets(plan, targets, metrics, args.full, args.dry_run, not args.no_sync)
+    except LookupError as e:
+        logger.info(str(e))
+        return 1
+
+    failed = False
+    for summary in summaries:
+        name = summary['target'] or 'katello'
+        if args.dry_run:
+            logger.info('%s: %d errata planned, %d up to date, %d of unknown repositories, %d to upload', name, summary['planned'], summary['skipped'],
+                        summary['unknown_repository'], summary['to_upload'])
+            continue
+        logger.info('%s: %d errata planned, %d up to date, %d of unknown repositories, %d uploaded, %d failed, %d not finished', name,
+                    summary['planned'], summary['skipped'], summary['unknown_repository'], summary['uploaded'], summary['failed'], summary['timed_out'])
+        for sync in summary['syncs']:
+            if sync['success']:
+                logger.info("%s: synchronization of %s finished in %.1fs, task id: %s", name, sync['repository_label'], sync['duration'], sync['task_id'])
+            else:
+                logger.error("%s: synchronization of %s failed after %.1fs, task id: %s: %s", name, sync['repository_label'], sync['duration'],
+                             sync['task_id'], sync['error'])
+        if summary['failed'] or not all(sync['success'] for sync in summary['syncs']):
+            failed = True
+
+    # Exit with an error if an upload or a synchronization failed
+    return 1 if failed else 0
+
+
+def command_daemon(args, conf_data):
+    import signal
+    from .daemon import ErrataDaemon, StatsServer, DEFAULT_LISTEN, DEFAULT_PORT
+
+    # The metrics files are written after each cycle
+    daemon = ErrataDaemon(conf_data, args.metrics_textfile, args.metrics_json)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+
+    conf_daemon = conf_data.get('daemon') or {}
+    with StatsServer(daemon, conf_daemon.get('listen', DEFAULT_LISTEN), conf_daemon.get('port', DEFAULT_PORT)) as server:
+        logger.info('Health and statistics available at %s/health and %s/stats', server.url, server.url)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
+    logger.info('Stopped')
+    return 0
+
+
+def command_bench(args):
+    import json
+    import tempfile
+    from .bench import run_benchmark, measure_startup
+
+    with tempfile.TemporaryDirectory(prefix='katelloerrata-bench-') as work_dir:
+        if args.startup:
+            results = measure_startup(work_dir, args.startup_runs)
+        else:
+            results = run_benchmark(work_dir, args.errata, args.packages, args.repositories, args.repository_packages,
+                                    args.batch_size, args.workers, args.backend, args.loader_workers)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    if args.startup and not results['target_met']:
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='katello-errata', description='Import the CentOS errata into Katello')
+    parser.add_argument('--config', '-c', default=DEFAULT_CONFIG, help='configuration file, %s by default' % DEFAULT_CONFIG)
+    # Also accepted after the command, as the scripts pass the command first.
+    # Its default is only set by the main parser, so the subcommand doesn't reset it.
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument('--config', '-c', default=argparse.SUPPRESS, help='configuration file, %s by default' % DEFAULT_CONFIG)
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    download_parser = subparsers.add_parser('download', parents=[config_parser],
+                                            help='download the CentOS errata and the Red Hat OVAL files, when they changed')
+    download_parser.set_defaults(func=command_download)
+
+    load_parser = subparsers.add_parser('load', parents=[config_parser],
+                                        help='load the CentOS errata and the OVAL descriptions into the errata store (Redis or SQLite)')
+    load_parser.add_argument('--workers', type=int,
+                             help='number of processes parsing the feeds and building the errata, '
+                                  'workers of the loader section of the configuration file by default')
+    load_parser.set_defaults(func=command_load)
+
+    import_parser = subparsers.add_parser('import', parents=[config_parser],
+                                          help='import the CentOS errata stored in the errata store into Katello')
+    import_parser.add_argument('--changed-only', action='store_true',
+                               help='only import the errata new or changed since the last --changed-only import')
+    import_parser.add_argument('--full', action='store_true',
+                               help='verify the import state of the repositories against their errata in Katello, '
+                                    'and refresh the cached package inventory of the repositories')
+    import_parser.set_defaults(func=command_import)
+
+    sync_parser = subparsers.add_parser('sync', parents=[config_parser],
+                                        help='synchronize the configured repositories, and wait for their tasks')
+    sync_parser.add_argument('--repository', action='append', help='label of a repository to synchronize, all by default')
+    sync_parser.set_defaults(func=command_sync)
+
+    plan_parser = subparsers.add_parser('plan', parents=[config_parser],
+                                        help='match the errata with the repositories packages, and write the import plan')
+    plan_parser.add_argument('--output', '-o', required=True, help='plan file, compressed if its name ends with .gz')
+    plan_parser.add_argument('--full', action='store_true', help='refresh the cached package inventory of the repositories')
+    plan_parser.set_defaults(func=command_plan)
+
+    apply_parser = subparsers.add_parser('apply', parents=[config_parser],
+                                         help='upload the errata of an import plan not imported yet, and synchronize the repositories')
+    apply_parser.add_argument('plan', help='plan file written by the plan command')
+    apply_parser.add_argument('--target', action='append',
+                              help='name of a Katello server of the targets section to apply the plan to, all by default')
+    apply_parser.add_argument('--dry-run', action='store_true', help='only tell what would be uploaded')
+    apply_parser.add_argument('--full', action='store_true',
+                              help='verify the import state of the repositories against their errata in Katello')
+    apply_parser.add_argument('--no-sync', action='store_true', help="don't synchronize the repositories")
+    apply_parser.set_defaults(func=command_apply)
+
+    daemon_parser = subparsers.add_parser('daemon', parents=[config_parser],
+                                          help='load and import the CentOS errata as a service, each time the data files are updated')
+    daemon_parser.set_defaults(func=command_daemon)
+
+    for subparser in (download_parser, load_parser, import_parser, sync_parser, plan_parser, apply_parser, daemon_parser):
+        add_arguments(subparser)
+
+    bench_parser = subparsers.add_parser('bench', help='benchmark the loader and importer stages offline, with synthetic feeds, '
+                                                       'a fake Redis or a SQLite store, and fake Katello and Pulp servers')
+    bench_parser.add_argument('--errata', type=int, default=1000, help='number of errata in the synthetic feed')
+    bench_parser.add_argument('--packages', type=int, default=4, help='number of binary packages per errata')
+    bench_parser.add_argument('--repositories', type=int, default=2, help='number of Katello repositories')
+    bench_parser.add_argument('--repository-packages', type=int, default=2000, help='number of packages per repository')
+    bench_parser.add_argument('--batch-size', type=int, default=500, help='errata store batch size')
+    bench_parser.add_argument('--backend', choices=('redis', 'sqlite'), default='redis',
+                              help='errata store: in-process Redis stand-in, or SQLite database')
+    bench_parser.add_argument('--workers', type=int, default=4, help='number of Katello and Pulp workers')
+    bench_parser.add_argument('--loader-workers', type=int, default=1,
+                              help='also load the feeds with this number of processes, and compare the errata with the ones loaded by one process')
+    bench_parser.add_argument('--startup', action='store_true',
+                              help='measure the startup time of the command line, and of a load with unchanged data files, '
+                                   'and exit with an error above the target')
+    bench_parser.add_argument('--startup-runs', type=int, default=5, help='number of runs of each --startup measure')
+    bench_parser.add_argument('--output', help='write the JSON results to this file instead of the standard output')
+    bench_parser.set_defaults(func=command_bench)
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the katello-errata command
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == 'bench':
+        return args.func(args)
+
+    if args.profile:
+        enable_profiling(args.profile)
+    setup_logging(args.debug)
+    conf_data = read_config(args.config)
+    return args.func(args, conf_data)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .katelloerrata import katelloErrata, ERRATA_FIELDS
+
+# Values in the compact format start with a version byte, which can't be
+# the first byte of a JSON document. Version 1 is a msgpack array of the
+# ERRATA_FIELDS values, in order.
+COMPACT_V1 = b'\x01'
+
+SERIALIZATIONS = ('json', 'msgpack')
+
+
+def encode_errata(errata, serialization='json'):
+    """
+    Serializes an errata, in JSON or in the compact msgpack layout
+    """
+    if serialization == 'msgpack':
+        if msgpack is None:
+            raise ImportError("The msgpack serialization needs the msgpack module.")
+        return COMPACT_V1 + msgpack.packb([getattr(errata, field) for field in ERRATA_FIELDS], use_bin_type=True)
+    return json.dumps(errata.to_dict()).encode('utf-8')
+
+
+def decode_errata(errata_id, value):
+    """
+    Returns a katelloErrata from its serialized value, whatever the format
+    """
+    if value[:1] == COMPACT_V1:
+        if msgpack is None:
+            raise ImportError("Errata stored in the msgpack serialization need the msgpack module.")
+        data = dict(zip(ERRATA_FIELDS, msgpack.unpackb(value[1:], raw=False)))
+    else:
+        data = json.loads(value.decode('utf-8'))
+    local_errata = katelloErrata(errata_id)
+    local_errata.bulk_create(data)
+    return local_errata
+
+
+if __name__ == '__main__':
+    print("Errata serialization functions for python")
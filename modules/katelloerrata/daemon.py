@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .feeds import find_feed
+from .importer import run_import
+from .inventory import InventoryCache
+from .katello import Katello
+from .loader import load_feeds, DEFAULT_WORKERS
+from .metrics import Metrics
+from .pulp import Pulp
+from .store import open_store
+
+DEFAULT_INTERVAL = 60
+DEFAULT_IMPORT_INTERVAL = 3600
+DEFAULT_LISTEN = '127.0.0.1'
+DEFAULT_PORT = 8089
+
+logger = logging.getLogger(__name__)
+
+
+class FeedWatcher(object):
+
+    """
+    Tells when the feeds of the data directory changed, from the name,
+    modification time and size of their downloaded variant
+    """
+    def __init__(self, file_names):
+        self.file_names = file_names
+        self.signature = None
+
+    def current(self):
+        signature = []
+        for file_name in self.file_names:
+            feed_file = find_feed(file_name)
+            try:
+                stat = os.stat(feed_file)
+            except OSError:
+                signature.append((feed_file, None, None))
+                continue
+            signature.append((feed_file, stat.st_mtime_ns, stat.st_size))
+        return signature
+
+    def changed(self):
+        """
+        Returns True if the feeds changed since the last call, or on the first call
+        """
+        signature = self.current()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+
+class ErrataDaemon(object):
+
+    """
+    Runs the load, match, upload and sync stages as one resident pipeline.
+    The configuration is parsed once, and the store connection, the Katello
+    and Pulp sessions and the repository inventories are kept between cycles.
+    The feeds are only loaded when they changed in the data directory. The
+    import runs after every load, and at least every import_interval seconds,
+    uploading only the errata not imported yet.
+    """
+    def __init__(self, conf_data, metrics_textfile=None, metrics_json=None):
+        conf_daemon = conf_data.get('daemon') or {}
+        self.conf_data = conf_data
+        self.interval = conf_daemon.get('interval', DEFAULT_INTERVAL)
+        self.import_interval = conf_daemon.get('import_interval', DEFAULT_IMPORT_INTERVAL)
+        self.loader_workers = (conf_data.get('loader') or {}).get('workers', DEFAULT_WORKERS)
+        self.metrics_textfile = metrics_textfile
+        self.metrics_json = metrics_json
+        self.metrics = Metrics('daemon')
+        self.store = open_store(conf_data)
+        self.katello = Katello({'conf_data': conf_data, 'metrics': self.metrics})
+        self.pulp = Pulp({'conf_data': conf_data, 'metrics': self.metrics})
+        self.inventory_cache = InventoryCache(conf_data['katello'].get('inventory_cache'))
+        self.watcher = FeedWatcher((conf_data['data_files']['errata_files'], conf_data['data_files']['oval_files']))
+        self.last_import = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {
+            'started_at': time.time(),
+            'state': 'starting',
+            'cycles': 0,
+            'loads': 0,
+            'imports': 0,
+            'failed_cycles': 0,
+            'last_cycle': None,
+            'last_error': None,
+        }
+
+    def _set_state(self, state):
+        with self.lock:
+            self.stats['state'] = state
+
+    def get_stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def run_cycle(self):
+        """
+        Loads the feeds if they changed, then imports the errata if the feeds
+        were loaded or if the last import is older than import_interval
+        """
+        # The API calls of the cycle are recorded in its own metrics
+        metrics = Metrics('daemon')
+        self.katello.metrics = metrics
+        self.pulp.metrics = metrics
+        loaded = False
+        imported = False
+        syncs = []
+        error = None
+        try:
+            if self.watcher.changed():
+                self._set_state('loading')
+                errata_file = find_feed(self.conf_data['data_files']['errata_files'])
+                oval_file = find_feed(self.conf_data['data_files']['oval_files'])
+                loaded = load_feeds(self.store, errata_file, oval_file, metrics, self.loader_workers)
+            if loaded or self.last_import is None or time.time() - self.last_import >= self.import_interval:
+                self._set_state('importing')
+                syncs = run_import(self.store, self.katello, self.pulp, self.conf_data, metrics, inventory_cache=self.inventory_cache)
+                self.last_import = time.time()
+                imported = True
+                failed_syncs = [sync['repository_label'] for sync in syncs if not sync['success']]
+                if failed_syncs:
+                    error = 'synchronization failed for %s' % ', '.join(failed_syncs)
+        except Exception as e:
+            logger.exception('Cycle failed')
+            error = str(e)
+            # Reload the feeds at the next cycle
+            self.watcher.signature = None
+
+        with self.lock:
+            self.stats['state'] = 'idle'
+            self.stats['cycles'] += 1
+            self.stats['loads'] += int(loaded)
+            self.stats['imports'] += int(imported)
+            if error is not None:
+                self.stats['failed_cycles'] += 1
+                self.stats['last_error'] = {'time': time.time(), 'error': error}
+            self.stats['last_cycle'] = dict(metrics.to_dict(), loaded=loaded, synced=len(syncs), success=error is None)
+        self.metrics = metrics
+        if self.metrics_textfile is not None:
+            metrics.write_textfile(self.metrics_textfile)
+        if self.metrics_json is not None:
+            metrics.write_json(self.metrics_json)
+
+    def run(self):
+        """
+        Runs the cycles every interval seconds, until stop() is called
+        """
+        logger.info('Watching %s and %s every %ds', self.conf_data['data_files']['errata_files'],
+                    self.conf_data['data_files']['oval_files'], self.interval)
+        while not self.stopping.is_set():
+            self.run_cycle()
+            self.stopping.wait(self.interval)
+
+    def stop(self):
+        self.stopping.set()
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+
+    """Answers GET /health and GET /stats with the state of the daemon"""
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, indent=2, sort_keys=True).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stats = self.server.errata_daemon.get_stats()
+        if self.path == '/health':
+            # Unhealthy once the last cycle failed
+            healthy = stats['last_cycle'] is None or stats['last_cycle']['success']
+            return self._send_json({'status': 'ok' if healthy else 'error', 'state': stats['state'],
+                                    'last_error': stats['last_error']}, 200 if healthy else 503)
+        if self.path == '/stats':
+            return self._send_json(stats)
+        self._send_json({'error': 'not found'}, 404)
+
+
+class StatsServer(object):
+
+    """Local HTTP server exposing the health and the statistics of the daemon"""
+    def __init__(self, daemon, listen=DEFAULT_LISTEN, port=DEFAULT_PORT):
+        self.httpd = ThreadingHTTPServer((listen, port), StatsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.errata_daemon = daemon
+        self.url = 'http://%s:%d' % self.httpd.server_address[:2]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    print("Daemon classes for python")
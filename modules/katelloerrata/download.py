@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import bz2
+import hashlib
+import json
+import logging
+import os
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from .feeds import COMPRESSIONS, feed_variants
+
+DEFAULT_ERRATA_URL = 'https://cefs.steve-meier.de/errata.latest.xml'
+DEFAULT_OVAL_URL = 'https://www.redhat.com/security/data/oval/com.redhat.rhsa-all.xml'
+DEFAULT_TIMEOUT = 300
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+STATE_FILE = '.download-state.json'
+
+# Hash algorithm of a published checksum, by length of its hex digest
+CHECKSUM_ALGORITHMS = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+logger = logging.getLogger(__name__)
+
+
+def _decompressor(file_name):
+    if file_name.endswith('.bz2'):
+        return bz2.BZ2Decompressor()
+    if file_name.endswith('.gz'):
+        # Accept the gzip header
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return None
+
+
+def parse_checksums(text):
+    """
+    Parses a checksum file in the sha1sum/sha256sum format, and returns
+    the checksums keyed by file base name
+    """
+    checksums = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        checksum, file_name = fields[0].lower(), fields[-1].lstrip('*')
+        if len(checksum) in CHECKSUM_ALGORITHMS:
+            checksums[os.path.basename(file_name)] = checksum
+    return checksums
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class FeedDownloader(object):
+
+    """
+    Downloads the errata and OVAL feeds, only when they changed
+    (ETag / If-Modified-Since), preferring their compressed variants.
+    The HTTP validators of the downloaded files are kept in a state file
+    next to them.
+    """
+    def __init__(self, params=None, session=None):
+        params = params or {}
+        self.compressions = params.get('compressions', COMPRESSIONS)
+        self.timeout = params.get('timeout', DEFAULT_TIMEOUT)
+        self.ssl_verify = params.get('ssl_verify', True)
+        self.metrics = params.get('metrics')
+        if session is None:
+            retries = Retry(
+                total=params.get('retries', DEFAULT_RETRIES),
+                backoff_factor=params.get('backoff', DEFAULT_BACKOFF),
+                status_forcelist=(500, 502, 503, 504),
+            )
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(max_retries=retries))
+            session.mount('http://', HTTPAdapter(max_retries=retries))
+        self.session = session
+
+    def _load_state(self, state_file):
+        try:
+            with open(state_file, 'r') as fh:
+                return json.load(fh)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_state(self, state_file, state):
+        tmp_file_name = state_file + '.tmp'
+        with open(tmp_file_name, 'w') as fh:
+            json.dump(state, fh, indent=2, sort_keys=True)
+        os.rename(tmp_file_name, state_file)
+
+    def get_checksums(self, checksum_url):
+        """
+        Returns the checksums published at checksum_url, keyed by file base name
+        """
+        r = self.session.get(checksum_url, timeout=self.timeout, verify=self.ssl_verify)
+        r.raise_for_status()
+        return parse_checksums(r.text)
+
+    def download(self, url, file_name, checksum_url=None):
+        """
+        Downloads the feed published at url into file_name, or into
+        file_name.bz2 / file_name.gz if a compressed variant is published.
+        Returns a dictionary describing the download: url, file, status
+        ('downloaded' or 'not_modified') and bytes. Raises ChecksumError if
+        the downloaded file doesn't match the published checksum, or
+        requests.HTTPError if no variant could be downloaded.
+        """
+        state_file = os.path.join(os.path.dirname(os.path.abspath(file_name)), STATE_FILE)
+        state = self._load_state(state_file)
+        checksums = {}
+        if checksum_url is not None:
+            try:
+                checksums = self.get_checksums(checksum_url)
+            except requests.exceptions.RequestException as e:
+                logger.warning('Checksums of %s not available, downloading without verification: %s', url, e)
+
+        candidates = [('%s.%s' % (url, compression), '%s.%s' % (file_name, compression)) for compression in self.compressions]
+        candidates.append((url, file_name))
+        error = None
+        for candidate_url, candidate_file in candidates:
+            headers = {}
+            validators = state.get(candidate_url, {})
+            # Only a file still on disk can be revalidated
+            if os.path.exists(candidate_file):
+                if validators.get('etag'):
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    headers['If-Modified-Since'] = validators['last_modified']
+
+            r = self.session.get(candidate_url, headers=headers, stream=True, timeout=self.timeout, verify=self.ssl_verify)
+            try:
+                if r.status_code == 304:
+                    logger.info('%s not modified', candidate_url)
+                    return {'url': candidate_url, 'file': candidate_file, 'status': 'not_modified', 'bytes': 0}
+                if r.status_code in (403, 404, 410) and candidate_url != url:
+                    logger.debug('%s not available (%d)', candidate_url, r.status_code)
+                    continue
+                try:
+                    r.raise_for_status()
+                except requests.exceptions.HTTPError as e:
+                    error = e
+                    continue
+                nb_bytes = self._write(r, candidate_file, checksums)
+            finally:
+                r.close()
+
+            # Only one variant of the feed is kept, so the loader reads the fresh one
+            for variant in feed_variants(file_name):
+                if variant != candidate_file and os.path.exists(variant):
+                    os.remove(variant)
+            state[candidate_url] = {
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+            }
+            self._save_state(state_file, state)
+            logger.info('%s downloaded into %s (%d bytes)', candidate_url, candidate_file, nb_bytes)
+            return {'url': candidate_url, 'file': candidate_file, 'status': 'downloaded', 'bytes': nb_bytes}
+        raise error
+
+    def _write(self, r, file_name, checksums):
+        """
+        Streams a response into file_name, checking its length and its
+        checksum on the fly. The file is only replaced once verified.
+        """
+        # The checksum can be published for the compressed file, or for the
+        # feed itself, which is then checked on the decompressed stream
+        base_name = os.path.basename(file_name)
+        uncompressed_name = os.path.basename(os.path.splitext(file_name)[0])
+        decompressor = None
+        if base_name in checksums:
+            expected = checksums[base_name]
+        elif uncompressed_name in checksums and _decompressor(file_name) is not None:
+            expected = checksums[uncompressed_name]
+            decompressor = _decompressor(file_name)
+        else:
+            expected = None
+        digest = hashlib.new(CHECKSUM_ALGORITHMS[len(expected)]) if expected is not None else None
+
+        nb_bytes = 0
+        tmp_file_name = file_name + '.part'
+        try:
+            with open(tmp_file_name, 'wb') as fh:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    fh.write(chunk)
+                    nb_bytes += len(chunk)
+                    if decompressor is not None:
+                        digest.update(decompressor.decompress(chunk))
+                    elif digest is not None:
+                        digest.update(chunk)
+
+            content_length = r.headers.get('Content-Length')
+            # The announced length is the one of the encoded body, if any
+            if content_length is not None and not r.headers.get('Content-Encoding') and int(content_length) != nb_bytes:
+                raise ChecksumError('%s is truncated: %d bytes received, %s announced' % (r.url, nb_bytes, content_length))
+            if digest is not None and digest.hexdigest() != expected:
+                raise ChecksumError('%s checksum mismatch: got %s, expected %s' % (r.url, digest.hexdigest(), expected))
+        except BaseException:
+            os.remove(tmp_file_name)
+            raise
+        os.rename(tmp_file_name, file_name)
+        if self.metrics is not None:
+            self.metrics.incr('download_bytes', nb_bytes)
+        return nb_bytes
+
+
+if __name__ == '__main__':
+    print("Feed download classes for python")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import bz2
+import gzip
+import hashlib
+import os
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Compressed variants of the feeds, by order of preference
+COMPRESSIONS = ('bz2', 'gz')
+
+
+def file_hash(file_name, algorithm='sha1', chunk_size=HASH_CHUNK_SIZE):
+    """
+    Computes the hash of a file, reading it by chunks
+    """
+    file_hash = hashlib.new(algorithm)
+    with open(file_name, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash
+
+
+def feed_variants(file_name):
+    """
+    Returns the compressed and uncompressed file names a feed can be stored as
+    """
+    return ['%s.%s' % (file_name, compression) for compression in COMPRESSIONS] + [file_name]
+
+
+def find_feed(file_name):
+    """
+    Returns the most recently downloaded variant of a feed, compressed or
+    not, or file_name itself if none exists
+    """
+    existing = [variant for variant in feed_variants(file_name) if os.path.exists(variant)]
+    if not existing:
+        return file_name
+    return max(existing, key=os.path.getmtime)
+
+
+def open_feed(file_name):
+    """
+    Opens a feed for reading, decompressing it on the fly if it is
+    a .bz2 or a .gz file, so it is never written uncompressed
+    """
+    if file_name.endswith('.bz2'):
+        return bz2.open(file_name, 'rb')
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'rb')
+    return open(file_name, 'rb')
+
+
+def iter_errata(errata_file):
+    """
+    Streams the errata elements of an errata.latest.xml document,
+    compressed or not.
+    Each element is complete when yielded and is freed as soon as
+    the caller asks for the next one.
+    """
+    # lxml is only imported once a feed is parsed
+    from lxml import etree
+
+    with open_feed(errata_file) as fh:
+        depth = 0
+        for event, elem in etree.iterparse(fh, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield elem
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+
+if __name__ == '__main__':
+    print("Errata feeds functions for python")
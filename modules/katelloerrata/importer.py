@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .inventory import inventory_key
+from .matcher import ErrataMatcher
+from .packages import PackageTable
+from .pulp import build_advisory
+from .uploader import AdvisoryUploader, DEFAULT_PER_REPOSITORY
+
+logger = logging.getLogger(__name__)
+
+
+def get_repositories(katello, conf_repositories):
+    """
+    Returns the Katello repositories listed in the configuration file,
+    keyed by os release then by label. Raises LookupError if one of
+    them doesn't exist in Katello.
+    """
+    all_repositories = {}
+
+    # First, get all repositories present in Katello and filter them
+    # to keep only the ones defined in the configuration file
+    katello_repositories = katello.get_repositories()
+    katello_labels = set(kat_repo['label'] for kat_repo in katello_repositories['results'])
+    for conf_repo in conf_repositories:
+        if conf_repo not in katello_labels:
+            raise LookupError("%s doesn't exits in Katello/Satellite" % conf_repo)
+
+    # Get repositories information from Katello/Satellite and configuration file
+    for repo in katello_repositories['results']:
+        if repo['label'] not in conf_repositories:
+            logger.info("Repository %s skipped, not in the configuration file", repo['label'])
+            continue
+        if conf_repositories[repo['label']]['os_release'] not in all_repositories:
+            all_repositories[conf_repositories[repo['label']]['os_release']] = {}
+        all_repositories[conf_repositories[repo['label']]['os_release']][repo['label']] = {
+            'id': repo['id'],
+            'pulp': conf_repositories[repo['label']]['pulp_id'],
+            'nb_erratas': 0,
+        }
+
+    # Get the details of all the selected repositories in parallel
+    with ThreadPoolExecutor(max_workers=katello.workers) as executor:
+        repositories_details = {}
+        for repo_release in all_repositories:
+            for repo in all_repositories[repo_release]:
+                repositories_details[(repo_release, repo)] = executor.submit(katello.get_repository_details, all_repositories[repo_release][repo]['id'])
+        for (repo_release, repo), details in repositories_details.items():
+            all_repositories[repo_release][repo]['checksumType'] = details.result()['checksum_type']
+            all_repositories[repo_release][repo]['inventory_key'] = inventory_key(details.result())
+    return all_repositories
+
+
+def get_repositories_content(katello, all_repositories, store=None, full=True, inventory_cache=None, errata=True):
+    """
+    Fetches the packages of all the repositories in parallel, into their
+    PackageTable as the API pages are received, and returns the
+    ErrataMatcher indexing them. With an inventory_cache, the packages of
+    the repositories unchanged since they were cached are not fetched.
+    The errata already imported in a repository are read from its import
+    state in the store. Katello's errata list of a repository is only
+    fetched with full, or when the repository has no import state yet, to
+    verify and update its import state. Without a store, it is always used.
+    The up to date errata of each repository are set in its imported_erratas.
+    Without errata, the errata already imported are ignored.
+    """
+    matcher = ErrataMatcher()
+    # Strings shared by the package tables of all the repositories
+    strings = {}
+    with ThreadPoolExecutor(max_workers=katello.workers) as executor:
+        repositories_content = {}
+        for repo_release in all_repositories:
+            for repo in all_repositories[repo_release]:
+                repository = all_repositories[repo_release][repo]
+                imported = store.get_imported(repo) if store is not None and errata else None
+                erratas = None
+                if errata and (full or not imported):
+                    erratas = executor.submit(katello.get_repository_erratas, repository['id'])
+                packages = None
+                if inventory_cache is not None:
+                    packages = inventory_cache.get(repository['id'], repository.get('inventory_key'), strings)
+                rpms = None
+                if packages is None:
+                    rpms = executor.submit(PackageTable.from_rpms, katello.iter_repository_packages(repository['id']), strings)
+                repositories_content[(repo_release, repo)] = (imported, erratas, packages, rpms)
+
+        for (repo_release, repo), (imported, erratas, packages, rpms) in repositories_content.items():
+            repository = all_repositories[repo_release][repo]
+
+            # Get the errata already in the repository
+            if not errata:
+                repository_erratas = set()
+            elif store is None:
+                repository_erratas = set(errata['errata_id'] for errata in erratas.result()['results'])
+            else:
+                katello_errata_ids = None
+                if erratas is not None:
+                    katello_errata_ids = set(errata['errata_id'] for errata in erratas.result()['results'])
+                repository_erratas = update_import_state(store, repo, imported, katello_errata_ids)
+            repository['imported_erratas'] = repository_erratas
+
+            # Get all packages, unless cached
+            if packages is None:
+                packages = rpms.result()
+                if inventory_cache is not None:
+                    inventory_cache.put(repository['id'], repository.get('inventory_key'), packages)
+            else:
+                logger.debug('Packages of %s read from the inventory cache', repo)
+            repository['packages'] = packages
+
+            # Index the repository packages and errata for the matching
+            matcher.add_repository(repo_release, repo, packages, repository_erratas)
+    return matcher
+
+
+def import_state_label(repository_label, target=None):
+    """
+    Returns the label the import state of a repository is stored under:
+    the repository label, prefixed by the name of its Katello target if any
+    """
+    if target is None:
+        return repository_label
+    return '%s/%s' % (target, repository_label)
+
+
+def update_import_state(store, repository_label, imported, katello_errata_ids=None, write=True):
+    """
+    Returns the IDs of the errata up to date in a repository: the ones
+    imported with the digest they still have in the store.
+    With katello_errata_ids, the errata of the repository in Katello, the
+    import state is verified first: the errata missing from Katello are
+    forgotten, and the stored errata found in Katello without an import
+    state are recorded as imported with their current digest. Without
+    write, the verified state isn't saved.
+    """
+    imported = dict(imported or {})
+    if katello_errata_ids is not None:
+        missing = [errata_id for errata_id in imported if errata_id not in katello_errata_ids]
+        if missing:
+            logger.info('%d imported errata missing from %s, they will be imported again', len(missing), repository_label)
+            if write:
+                store.remove_imported(repository_label, missing)
+            for errata_id in missing:
+                del imported[errata_id]
+        unknown = [errata_id for errata_id in katello_errata_ids if errata_id not in imported]
+        now = time.time()
+        adopted = dict((errata_id, (digest, now)) for errata_id, digest in store.get_digests(unknown).items())
+        if adopted and write:
+            store.set_imported(repository_label, adopted)
+        imported.update(adopted)
+
+    digests = store.get_digests(list(imported))
+    return set(errata_id for errata_id, (digest, imported_at) in imported.items() if digests.get(errata_id) == digest)
+
+
+def record_imports(store, upload_results, target=None):
+    """
+    Records the successful uploads in the import state of their repository,
+    in the Katello target if any
+    """
+    imported = {}
+    for result in upload_results:
+        if result['success'] and result['digest'] is not None:
+            imported.setdefault(import_state_label(result['repository_label'], target), {})[result['errata_id']] = (result['digest'], result['finished_at'])
+    for repository_label, repository_imported in imported.items():
+        store.set_imported(repository_label, repository_imported)
+
+
+def select_errata(store, all_repositories, changed_errata_ids=None):
+    """
+    Returns the errata to process, read lazily from the store.
+    With the secondary indexes, only the errata of the configured os releases
+    containing at least one package of their repositories, and not already
+    up to date in one of them, are read.
+    changed_errata_ids restricts the errata to the given IDs.
+    """
+    if not store.has_indexes():
+        logger.info('Redis secondary indexes not found, reading all the errata')
+        if changed_errata_ids is not None:
+            return store.iter_errata_by_ids(changed_errata_ids)
+        return store.iter_errata()
+
+    candidate_errata_ids = set()
+    for repo_release in all_repositories:
+        repo_filenames = set()
+        # An errata up to date in a repository has nothing left to do in its os release
+        imported_errata_ids = set()
+        for repo in all_repositories[repo_release]:
+            repo_filenames.update(all_repositories[repo_release][repo]['packages'])
+            imported_errata_ids.update(all_repositories[repo_release][repo].get('imported_erratas', ()))
+        candidate_errata_ids |= store.candidate_errata_ids(repo_release, repo_filenames) - imported_errata_ids
+    if changed_errata_ids is not None:
+        candidate_errata_ids &= set(changed_errata_ids)
+    logger.info('Number of errata matching the repositories packages %d', len(candidate_errata_ids))
+    return store.iter_errata_by_ids(sorted(candidate_errata_ids))
+
+
+def submit_errata(erratas, matcher, all_repositories, uploader):
+    """
+    Matches the errata with the repositories, and queues the upload of the
+    matching ones. Returns the number of errata processed.
+    """
+    nb_errata = 0
+    for errata in erratas:
+        logger.debug("Processing errata %s", errata.errata_id)
+        nb_errata += 1
+
+        # Find the repository containing the errata's packages matching its os release
+        errata_packages_details = matcher.match(errata)
+        if errata_packages_details is not None:
+            repository = all_repositories[errata_packages_details['repository_release']][errata_packages_details['repository_label']]
+            # Upload the advisory into the Pulp repository
+            advisory = build_advisory(errata, errata_packages_details, repository['checksumType'])
+            uploader.submit(advisory, repository['pulp'], errata_packages_details['repository_label'], errata.get_digest())
+    return nb_errata
+
+
+def count_upload_results(upload_results, all_repositories):
+    """
+    Counts the successful uploads per repository, logs the failed and the
+    timed out ones, and returns the sets of the failed and of the timed out
+    errata IDs
+    """
+    failed_errata_ids = set()
+    timed_out_errata_ids = set()
+    for result in upload_results:
+        if result['success']:
+            for repo_release in all_repositories:
+                if result['repository_label'] in all_repositories[repo_release]:
+                    all_repositories[repo_release][result['repository_label']]['nb_erratas'] += 1
+        elif result['timed_out']:
+            timed_out_errata_ids.add(result['errata_id'])
+            logger.warning("Upload of errata %s in %s not finished: %s", result['errata_id'], result['pulp_id'], result['error'])
+        else:
+            failed_errata_ids.add(result['errata_id'])
+            logger.error("Upload of errata %s in %s failed after %d attempt(s): %s", result['errata_id'], result['pulp_id'], result['attempts'], result['error'])
+    return failed_errata_ids, timed_out_errata_ids
+
+
+def sync_repository(katello, repository_label, repository_id):
+    """
+    Starts the synchronization of a repository, waits for its task to end,
+    and returns a dictionary describing it: repository_label, task_id,
+    state, result, duration, success and error
+    """
+    sync = {
+        'repository_label': repository_label,
+        'task_id': None,
+        'state': None,
+        'result': None,
+        'duration': None,
+        'success': False,
+        'error': None,
+    }
+    start = time.time()
+    try:
+        task = katello.start_repo_sync(repository_id)
+        if 'id' not in task:
+            sync['error'] = task.get('displayMessage', task.get('error', str(task)))
+            return sync
+        sync['task_id'] = task['id']
+        logger.info("Synchronization of %s started, task id: %s, started at: %s, state: %s", repository_label, task['id'], task.get('started_at'), task.get('state'))
+        task = katello.wait_for_task(task['id'])
+    except Exception as e:
+        sync['error'] = str(e)
+        return sync
+    finally:
+        sync['duration'] = time.time() - start
+    sync['state'] = task['state']
+    sync['result'] = task.get('result')
+    # A warning doesn't prevent the errata from being published
+    sync['success'] = task['state'] == 'stopped' and sync['result'] in ('success', 'warning')
+    if not sync['success']:
+        sync['error'] = task.get('humanized', {}).get('errors') or 'task %s %s' % (sync['state'], sync['result'])
+    return sync
+
+
+def sync_repositories(katello, all_repositories, force=False):
+    """
+    Synchronizes the repositories which received errata, or all of them
+    with force, at most katello.sync_concurrency at a time, and returns the
+    list of their sync_repository() results
+    """
+    to_sync = []
+    for repo_release in all_repositories:
+        for repo in all_repositories[repo_release]:
+            if all_repositories[repo_release][repo]['nb_erratas'] == 0 and not force:
+                logger.info("No errata added to %s, synchronization skipped", repo)
+                continue
+            to_sync.append((repo, all_repositories[repo_release][repo]['id']))
+
+    with ThreadPoolExecutor(max_workers=max(katello.sync_concurrency, 1)) as executor:
+        futures = [executor.submit(sync_repository, katello, repo, repository_id) for repo, repository_id in to_sync]
+        return [future.result() for future in futures]
+
+
+def run_import(store, katello, pulp, conf_data, metrics, full=False, changed_only=False, inventory_cache=None):
+    """
+    Imports the errata of the store into the configured repositories, then
+    synchronizes the ones which received errata, and records the stages and
+    counters in metrics. Returns the list of the sync_repository() results.
+    Raises LookupError if a configured repository doesn't exist in Katello.
+    """
+    round_trips = store.round_trips
+
+    # 1. Errata are loaded lazily from the store, by batches, while they are
+    # processed. The secondary indexes narrow them down after step 3.
+    changed_errata_ids = None
+    if changed_only:
+        changed_errata_ids = store.changed_errata_ids()
+        logger.info('Number of errata new or changed since the last import %d', len(changed_errata_ids))
+
+    # 2. Get data for repositories listed in configuration file
+    logger.info('Get repositories information from Katello/Satellite and configuration file...')
+    with metrics.stage('repositories'):
+        all_repositories = get_repositories(katello, conf_data['repositories'])
+
+    # 3. Get errata packages data for the selected repositories.
+    # Errata already imported are read from the import state of the repositories,
+    # Katello's errata lists are only fetched to verify it. The package inventories
+    # of the repositories unchanged since the last run are read from the cache.
+    logger.info('Get errata packages data for the selected repositories...')
+    if inventory_cache is not None:
+        hits, misses = inventory_cache.hits, inventory_cache.misses
+    with metrics.stage('inventory'):
+        matcher = get_repositories_content(katello, all_repositories, store, full, inventory_cache)
+    if inventory_cache is not None:
+        logger.info('Package inventories read from the cache %d, fetched %d', inventory_cache.hits - hits, inventory_cache.misses - misses)
+        metrics.set('inventory_cache_hits', inventory_cache.hits - hits)
+        metrics.set('inventory_cache_misses', inventory_cache.misses - misses)
+    all_erratas = select_errata(store, all_repositories, changed_errata_ids)
+
+    # 4. Create the errata: advisories are uploaded by a pool of workers,
+    # while the next errata are matched
+    uploader = AdvisoryUploader(pulp, conf_data['pulp'].get('per_repository', DEFAULT_PER_REPOSITORY))
+    with metrics.stage('upload'):
+        nb_errata = submit_errata(all_erratas, matcher, all_repositories, uploader)
+    logger.info('Number of errata loaded from the errata store %d', nb_errata)
+
+    # Wait for the uploads
+    with metrics.stage('upload_wait'):
+        upload_results = uploader.results()
+        failed_errata_ids, timed_out_errata_ids = count_upload_results(upload_results, all_repositories)
+        record_imports(store, upload_results)
+    logger.info('Number of errata uploads failed %d', len(failed_errata_ids))
+    logger.info('Number of errata uploads not finished within the task timeout %d', len(timed_out_errata_ids))
+    logger.info('Number of errata store round trips %d', store.round_trips - round_trips)
+    metrics.set('errata_processed', nb_errata)
+    metrics.set('errata_matched', uploader.submitted)
+    metrics.set('errata_uploaded', uploader.submitted - len(failed_errata_ids) - len(timed_out_errata_ids))
+    metrics.set('errata_failed', len(failed_errata_ids))
+    metrics.set('errata_timed_out', len(timed_out_errata_ids))
+    metrics.set('store_round_trips', store.round_trips - round_trips)
+
+    # Failed and timed out errata stay in the changed set, to be retried by the next import
+    if changed_only:
+        store.clear_changed([errata_id for errata_id in changed_errata_ids
+                             if errata_id not in failed_errata_ids and errata_id not in timed_out_errata_ids])
+
+    for repo_release in all_repositories:
+        for repo in all_repositories[repo_release]:
+            logger.info("%s errata(s) added to %s", all_repositories[repo_release][repo]['nb_erratas'], repo)
+
+    # Only the repositories which received errata are synchronized
+    with metrics.stage('sync'):
+        syncs = sync_repositories(katello, all_repositories)
+    nb_failed_syncs = 0
+    for sync in syncs:
+        if sync['success']:
+            logger.info("Synchronization of %s finished in %.1fs, task id: %s, state: %s, result: %s",
+                        sync['repository_label'], sync['duration'], sync['task_id'], sync['state'], sync['result'])
+        else:
+            nb_failed_syncs += 1
+            logger.error("Synchronization of %s failed after %.1fs, task id: %s, state: %s, result: %s: %s",
+                         sync['repository_label'], sync['duration'], sync['task_id'], sync['state'], sync['result'], sync['error'])
+    metrics.set('repositories_synced', len(syncs) - nb_failed_syncs)
+    metrics.set('repositories_sync_failed', nb_failed_syncs)
+    return syncs
+
+
+if __name__ == '__main__':
+    print("Errata importer functions for python")
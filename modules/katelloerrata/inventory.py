@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+
+from .packages import PackageTable
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'repository-%s.json'
+# Format of the cache files: rows of the package fields
+CACHE_VERSION = 2
+
+
+def inventory_key(repository_details):
+    """
+    Returns what identifies the package content of a repository in its
+    Katello details: the end of its last sync and its number of packages.
+    Uploaded errata don't change it. Returns None if the details have neither.
+    """
+    last_sync = repository_details.get('last_sync') or {}
+    content_counts = repository_details.get('content_counts') or {}
+    key = {
+        'last_sync': last_sync.get('ended_at'),
+        'rpm': content_counts.get('rpm'),
+    }
+    if key['last_sync'] is None and key['rpm'] is None:
+        return None
+    return key
+
+
+class InventoryCache(object):
+
+    """
+    Local cache of the package tables of the Katello repositories, one
+    JSON file per repository ID, valid as long as the inventory key of the
+    repository doesn't change. The inventories are also kept in memory, for
+    the processes running several imports; without directory, they are only
+    kept in memory. With refresh, the cache is written but not read. With
+    read_only, the files are read but not written.
+    """
+    def __init__(self, directory=None, refresh=False, read_only=False):
+        self.directory = directory
+        self.refresh = refresh
+        self.read_only = read_only
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+        if directory is not None and not read_only and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _file_name(self, repository_id):
+        return os.path.join(self.directory, CACHE_FILE % repository_id)
+
+    def get(self, repository_id, key, strings=None):
+        """
+        Returns the cached PackageTable of a repository, or None if it is not
+        cached or if the repository changed since. The strings of a table read
+        from its file are interned in strings.
+        """
+        if self.refresh or key is None:
+            self.misses += 1
+            return None
+        if repository_id in self.memory and self.memory[repository_id][0] == key:
+            self.hits += 1
+            return self.memory[repository_id][1]
+        if self.directory is None:
+            self.misses += 1
+            return None
+        try:
+            with open(self._file_name(repository_id), 'r') as fh:
+                data = json.load(fh)
+        except (IOError, ValueError):
+            self.misses += 1
+            return None
+        if data.get('version') != CACHE_VERSION:
+            self.misses += 1
+            return None
+        if data.get('key') != key:
+            logger.debug('Package inventory of repository %s changed, refreshing it', repository_id)
+            self.misses += 1
+            return None
+        self.hits += 1
+        packages = PackageTable.from_rows(data['packages'], strings)
+        self.memory[repository_id] = (key, packages)
+        return packages
+
+    def put(self, repository_id, key, packages):
+        if key is None:
+            return
+        self.memory[repository_id] = (key, packages)
+        if self.directory is None or self.read_only:
+            return
+        file_name = self._file_name(repository_id)
+        tmp_file_name = file_name + '.tmp'
+        with open(tmp_file_name, 'w') as fh:
+            json.dump({'version': CACHE_VERSION, 'key': key, 'packages': packages.to_rows()}, fh, separators=(',', ':'))
+        os.rename(tmp_file_name, file_name)
+
+
+if __name__ == '__main__':
+    print("Repository inventory cache classes for python")
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import sys
+import time
 
 from yaml import load
 try:
@@ -18,15 +19,30 @@ try:
 except ImportError:
     print("Please install the python-requests module.")
     sys.exit(-1)
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from requests.packages.urllib3.util.retry import Retry
+
+DEFAULT_PER_PAGE = 1000
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1
+DEFAULT_TIMEOUT = 300
+DEFAULT_TASKS_API_URL = '/foreman_tasks/api/'
+DEFAULT_SYNC_CONCURRENCY = 2
+DEFAULT_TASK_TIMEOUT = 3600
+DEFAULT_TASK_POLL_INTERVAL = 5
+TASK_FINAL_STATES = ('stopped', 'paused')
 
 
 class Katello(object):
     """docstring for Katello"""
 
     def __init__(self, params):
-        # Read configuration file
-        if params['conf_file'] is not None:
+        # Read configuration file, unless the configuration is given
+        if params.get('conf_data') is not None:
+            conf_data = params['conf_data']
+        elif params.get('conf_file') is not None:
             with open(params['conf_file'], 'r') as yaml_file:
                 conf_data = load(yaml_file, Loader=Loader)
                 yaml_file.close()
@@ -38,47 +54,88 @@ class Katello(object):
         self.katello_password = conf_data['katello']['password']
         self.ssl_verify = conf_data['katello']['ssl_verify']
         self.post_headers = {'Content-Type': 'application/json'}
+        self.per_page = conf_data['katello'].get('per_page', DEFAULT_PER_PAGE)
+        self.workers = conf_data['katello'].get('workers', DEFAULT_WORKERS)
+        self.timeout = conf_data['katello'].get('timeout', DEFAULT_TIMEOUT)
+        self.tasks_api = self.katello_server_url + conf_data['katello'].get('tasks_api_url', DEFAULT_TASKS_API_URL)
+        self.sync_concurrency = conf_data['katello'].get('sync_concurrency', DEFAULT_SYNC_CONCURRENCY)
+        self.task_timeout = conf_data['katello'].get('task_timeout', DEFAULT_TASK_TIMEOUT)
+        self.task_poll_interval = conf_data['katello'].get('task_poll_interval', DEFAULT_TASK_POLL_INTERVAL)
+
+        if not self.ssl_verify:
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+        # One pooled session for all the API calls, with enough connections
+        # for the parallel workers and retries of the idempotent requests
+        retries = Retry(
+            total=conf_data['katello'].get('retries', DEFAULT_RETRIES),
+            backoff_factor=conf_data['katello'].get('backoff', DEFAULT_BACKOFF),
+            status_forcelist=(500, 502, 503, 504),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.auth = (self.katello_user, self.katello_password)
+        self.session.verify = self.ssl_verify
+        # Record the API calls in the metrics of the run, if any
+        self.metrics = params.get('metrics')
+        if self.metrics is not None:
+            self.session.hooks['response'].append(self._observe_response)
+
+    def _observe_response(self, r, *args, **kwargs):
+        self.metrics.observe_api_call('katello', r.elapsed.total_seconds(), len(r.content))
 
     def _get_json(self, location, data, params):
         """
         Performs a GET using the passed URL location
         """
-        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-        if params is None:
-            params = {
-                'per_page': 99999,
-            }
-        else:
-            params['per_page'] = 99999
-
-        r = requests.get(
+        r = self.session.get(
             self.katello_api + location,
             data=data,
             params=params,
-            auth=(self.katello_user, self.katello_password),
-            verify=self.ssl_verify,
+            timeout=self.timeout,
         )
+        r.raise_for_status()
         return r.json()
 
+    def _iter_json(self, location, data, params):
+        """
+        Performs paginated GETs using the passed URL location,
+        and yields the results one page after the other
+        """
+        if params is None:
+            params = {}
+        params['per_page'] = self.per_page
+        page = 1
+        nb_results = 0
+        while True:
+            params['page'] = page
+            result = self._get_json(location, data, params)
+            for item in result['results']:
+                yield item
+            nb_results += len(result['results'])
+            if not result['results'] or nb_results >= result.get('subtotal', result.get('total', 0)):
+                break
+            page += 1
+
     def _post_json(self, location, data):
         """
         Performs a POST and passes the data to the URL location
         """
-        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
         if data is not None:
             _data = json.dumps(data)
         else:
             _data = None
-        result = requests.post(
+        result = self.session.post(
             self.katello_api + location,
             data=_data,
-            auth=(self.katello_user, self.katello_password),
-            verify=self.ssl_verify,
-            headers=self.post_headers)
+            headers=self.post_headers,
+            timeout=self.timeout)
         return result.json()
 
     def get_repositories(self):
-        return(self._get_json('repositories', None, None))
+        return({'results': list(self._iter_json('repositories', None, None))})
 
     def get_repository_details(self, repository_id):
         return(self._get_json('repositories/' + str(repository_id), None, None))
@@ -87,14 +144,16 @@ class Katello(object):
         data = {
             'repository_id': repository_id,
         }
-        return(self._get_json('errata', data, None))
+        return({'results': list(self._iter_json('errata', data, None))})
 
-    def get_repository_packages(self, repository_id):
+    def iter_repository_packages(self, repository_id):
+        """
+        Yields the packages of a repository, one API page after the other
+        """
         data = {
             'repository_id': repository_id,
         }
-        # return(self._get_json('repositories/' + str(repository_id) + '/packages', None))
-        return(self._get_json('packages', data, None))
+        return self._iter_json('packages', data, None)
 
     def start_repo_sync(self, repository_id):
         data = {
@@ -102,6 +161,26 @@ class Katello(object):
         }
         return(self._post_json('repositories/' + str(repository_id) + '/sync', data))
 
+    def get_task(self, task_id):
+        """
+        Returns a task of the foreman-tasks API
+        """
+        r = self.session.get(self.tasks_api + 'tasks/' + str(task_id), timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def wait_for_task(self, task_id):
+        """
+        Polls a task until it reaches a final state, or until task_timeout,
+        and returns it
+        """
+        deadline = time.time() + self.task_timeout
+        while True:
+            task = self.get_task(task_id)
+            if task['state'] in TASK_FINAL_STATES or time.time() > deadline:
+                return task
+            time.sleep(self.task_poll_interval)
+
 
 if __name__ == '__main__':
     print("Katello API class for python")
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
-import re
+import hashlib
+import json
+import sys
+
+from .rpm import parse_rpm_filename
 
 default_errata_types = {
     'Security Advisory': 'security',
@@ -9,9 +13,27 @@ default_errata_types = {
 }
 
 
+# Serialized attributes of an errata, in the order of the compact layouts.
+# packages_by_os_release is derived from os_releases and all_packages.
+ERRATA_FIELDS = (
+    'release',
+    'severity',
+    'description',
+    'synopsis',
+    'issue_date',
+    'errata_type',
+    'email',
+    'os_releases',
+    'all_packages',
+    'references',
+)
+
+
 class katelloErrata(object):
 
     """docstring for Errata"""
+    __slots__ = ('errata_id', 'packages_by_os_release') + ERRATA_FIELDS
+
     def __init__(self, errata_id):
         self.errata_id = errata_id
         self.release = None
@@ -27,17 +49,35 @@ class katelloErrata(object):
         self.packages_by_os_release = {}
 
     def bulk_create(self, data):
+        """
+        Sets the errata from its serialized attributes. The packages_by_os_release
+        of the former JSON format is ignored, it is rebuilt from the packages.
+        """
         self.release = data['release']
-        self.severity = data['severity']
+        self.set_severity(data['severity'])
         self.description = data['description']
         self.synopsis = data['synopsis']
         self.issue_date = data['issue_date']
         self.set_errata_type(data['errata_type'])
         self.email = data['email']
-        self.os_releases = data['os_releases']
-        self.all_packages = data['all_packages']
+        for os_release in data['os_releases']:
+            self.add_os_release(int(os_release))
+        for package in data['all_packages']:
+            self.add_package(package)
         self.references = data['references']
-        self.packages_by_os_release = data['packages_by_os_release']
+
+    def to_dict(self):
+        """
+        Returns the serialized attributes of the errata
+        """
+        return dict((field, getattr(self, field)) for field in ERRATA_FIELDS)
+
+    def get_digest(self):
+        """
+        Returns a digest of the errata attributes and packages,
+        used to detect upstream changes
+        """
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode('utf-8')).hexdigest()
 
     def get_errata_id(self):
         return self.errata_id
@@ -49,7 +89,7 @@ class katelloErrata(object):
         return self.release
 
     def set_severity(self, errata_severity):
-        self.severity = errata_severity
+        self.severity = sys.intern(errata_severity)
 
     def get_severity(self):
         return self.severity
@@ -76,7 +116,7 @@ class katelloErrata(object):
         if errata_type in default_errata_types:
             self.errata_type = default_errata_types[errata_type]
         else:
-            self.errata_type = errata_type
+            self.errata_type = sys.intern(errata_type)
 
     def get_errata_type(self):
         return self.errata_type
@@ -89,8 +129,7 @@ class katelloErrata(object):
 
     def add_os_release(self, os_release):
         self.os_releases.append(os_release)
-        self.packages_by_os_release[os_release] = {}
-        self.packages_by_os_release[os_release]['packages'] = []
+        self.packages_by_os_release[os_release] = []
 
     def get_os_releases(self):
         return self.os_releases
@@ -102,12 +141,15 @@ class katelloErrata(object):
         return self.references
 
     def add_package(self, errata_package):
+        # Package filenames are shared by many errata and repositories
+        errata_package = sys.intern(errata_package)
         self.all_packages.append(errata_package)
-        for os_release in self.os_releases:
-            if re.match(r'.+\.src\.rpm', errata_package):
-                continue
-            if re.match(r'.+\.(el|EL|rhel|RHEL)' + str(os_release) + r'.+', errata_package):
-                self.packages_by_os_release[os_release]['packages'].append(errata_package)
+        # Binary packages are bucketed by the os release of their dist tag
+        rpm = parse_rpm_filename(errata_package)
+        if rpm is None or rpm.is_source():
+            return
+        if rpm.os_release in self.packages_by_os_release:
+            self.packages_by_os_release[rpm.os_release].append(errata_package)
 
     def get_packages_for_os_release(self, os_release):
         if os_release in self.os_releases:
@@ -119,7 +161,7 @@ class katelloErrata(object):
             #     if re.match(r'.+\.(el|EL|rhel|RHEL)' + str(os_release) + r'.+', package):
             #         pkgs.append(package)
             # return pkgs
-            return self.packages_by_os_release[str(os_release)]['packages']
+            return self.packages_by_os_release[os_release]
         else:
             return None
 
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+import logging
+import re
+
+from collections import deque
+from contextlib import nullcontext
+
+from .feeds import file_hash, iter_errata
+from .katelloerrata import katelloErrata
+from .oval import OvalIndex, oval_id_for_errata
+
+DEFAULT_WORKERS = 1
+# Errata chunks built ahead of the writer, per worker
+CHUNKS_PER_WORKER = 2
+
+logger = logging.getLogger(__name__)
+
+
+def errata_record(errata):
+    """
+    Returns the tag, the attributes and the (tag, text) children of an
+    errata element of errata.latest.xml, as values which can be sent to
+    another process
+    """
+    return errata.tag, dict(errata.attrib), [(errata_info.tag, errata_info.text) for errata_info in errata]
+
+
+def errata_id_for_tag(tag):
+    # Rename the errata
+    return re.sub(r'--', r':', tag)
+
+
+def build_errata(errata):
+    """
+    Returns the katelloErrata of an errata element of errata.latest.xml,
+    or None if it is not a CentOS errata
+    """
+    return build_errata_record(errata.tag, errata.attrib, ((errata_info.tag, errata_info.text) for errata_info in errata))
+
+
+def build_errata_record(tag, attrib, errata_infos):
+    """
+    Returns the katelloErrata of an errata record, or None if it is not
+    a CentOS errata
+    """
+    # Only consider CentOS errata
+    if not re.match(r'^CE', tag):
+        logger.debug('Skpping %s : not CentOS errata', tag)
+        return None
+
+    logger.debug("Retrieving data for errata %s", tag)
+
+    errata_id = errata_id_for_tag(tag)
+
+    # Get errata information
+    local_errata = katelloErrata(errata_id)
+    local_errata.set_synopsis(attrib['synopsis'].replace(',', ';'))
+    local_errata.set_issue_date(attrib['issue_date'])
+    local_errata.set_release(attrib['release'])
+    local_errata.set_email(attrib['from'])
+    if 'severity' in attrib:
+        local_errata.set_severity(attrib['severity'])
+    else:
+        local_errata.set_severity('Low')
+    local_errata.set_errata_type(attrib['type'])
+    for ref in attrib['references'].split():
+        local_errata.add_reference(ref)
+
+    for errata_info_tag, errata_info_text in errata_infos:
+        if errata_info_tag == 'os_release':
+            local_errata.add_os_release(int(errata_info_text))
+        elif errata_info_tag == 'packages':
+            local_errata.add_package(errata_info_text)
+    return local_errata
+
+
+def set_description(local_errata, oval_descriptions):
+    """
+    Sets the description of an errata from its OVAL definition, for the
+    security errata, or from its synopsis
+    """
+    oval_id = oval_id_for_errata(local_errata.errata_id)
+    if oval_id is not None:
+        oval_description = oval_descriptions.get(oval_id)
+        if oval_description is not None:
+            local_errata.set_description(oval_description)
+    if local_errata.description is None:
+        local_errata.set_description(local_errata.synopsis)
+
+
+def write_errata_batch(store, errata_batch, reindex):
+    """
+    Sets the description of the security errata of the batch from the
+    OVAL descriptions cache, with a single lookup, then writes the batch
+    """
+    oval_ids = {}
+    for local_errata in errata_batch:
+        oval_id = oval_id_for_errata(local_errata.errata_id)
+        if oval_id is not None:
+            oval_ids[local_errata.errata_id] = oval_id
+    oval_descriptions = store.get_oval_descriptions(list(set(oval_ids.values())))
+
+    for local_errata in errata_batch:
+        set_description(local_errata, oval_descriptions)
+
+    store.write_errata(errata_batch, reindex)
+
+
+def parse_oval(oval_file):
+    """
+    Returns the OVAL descriptions of oval_file, keyed by OVAL definition ID,
+    and its number of definitions
+    """
+    oval_index = OvalIndex()
+    oval_index.load(oval_file)
+    return oval_index.get_descriptions(), len(oval_index)
+
+
+def load_oval(store, oval_file):
+    """
+    Indexes the OVAL definitions of oval_file and replaces the cached
+    OVAL descriptions. Returns the number of definitions.
+    """
+    oval_descriptions, nb_definitions = parse_oval(oval_file)
+    store.set_oval_descriptions(oval_descriptions)
+    return nb_definitions
+
+
+def build_errata_chunk(errata_records, oval_descriptions):
+    """
+    Returns the katelloErrata of a chunk of errata records, with their
+    description set from the given OVAL descriptions. Runs in the
+    processes of the loader pool.
+    """
+    errata_chunk = []
+    for record in errata_records:
+        local_errata = build_errata_record(*record)
+        if local_errata is not None:
+            set_description(local_errata, oval_descriptions)
+            errata_chunk.append(local_errata)
+    return errata_chunk
+
+
+def load_errata(store, errata_file, reindex, metrics=None):
+    """
+    Streams the errata of errata_file into the store, by batches.
+    Only the new errata, and the ones whose digest changed, are written.
+    The time spent writing is recorded in the errata_write stage of metrics.
+    """
+    def write_timer():
+        return metrics.stage('errata_write') if metrics is not None else nullcontext()
+
+    errata_batch = []
+    for errata in iter_errata(errata_file):
+        local_errata = build_errata(errata)
+        if local_errata is None:
+            continue
+        # The description of security errata is set from the OVAL
+        # descriptions cache when the batch is written
+        errata_batch.append(local_errata)
+        if len(errata_batch) >= store.batch_size:
+            with write_timer():
+                write_errata_batch(store, errata_batch, reindex)
+            errata_batch = []
+    with write_timer():
+        write_errata_batch(store, errata_batch, reindex)
+
+
+def iter_errata_chunks(errata_file, chunk_size):
+    """
+    Streams the records of the CentOS errata of errata_file, by lists of chunk_size
+    """
+    errata_records = []
+    for errata in iter_errata(errata_file):
+        # Only consider CentOS errata
+        if not re.match(r'^CE', errata.tag):
+            logger.debug('Skpping %s : not CentOS errata', errata.tag)
+            continue
+        errata_records.append(errata_record(errata))
+        if len(errata_records) >= chunk_size:
+            yield errata_records
+            errata_records = []
+    if errata_records:
+        yield errata_records
+
+
+def get_chunk_oval_descriptions(store, errata_records):
+    """
+    Returns the cached OVAL descriptions of the security errata of a chunk
+    """
+    oval_ids = set()
+    for tag, attrib, errata_infos in errata_records:
+        oval_id = oval_id_for_errata(errata_id_for_tag(tag))
+        if oval_id is not None:
+            oval_ids.add(oval_id)
+    return store.get_oval_descriptions(list(oval_ids))
+
+
+def load_errata_parallel(store, errata_file, oval_file, reindex, workers, metrics=None):
+    """
+    Loads errata_file into the store with a pool of workers processes, and
+    replaces the cached OVAL descriptions with the ones of oval_file, unless
+    it is None. The OVAL file is parsed by a worker while this process parses
+    the errata file. The errata are then built and joined with their OVAL
+    description by the workers, by chunks of batch_size, and written by this
+    process, the only writer, in the order of the file: the store is the same
+    whatever the number of workers. At most workers * CHUNKS_PER_WORKER
+    chunks are in memory, parsed or built ahead of the writer.
+    Returns the number of OVAL definitions, or None without oval_file.
+    """
+    def stage(name):
+        return metrics.stage(name) if metrics is not None else nullcontext()
+
+    # multiprocessing is only imported by the loads with several workers
+    from concurrent.futures import ProcessPoolExecutor
+
+    max_chunks = workers * CHUNKS_PER_WORKER
+    nb_definitions = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        oval_future = None
+        if oval_file is not None:
+            oval_future = executor.submit(parse_oval, oval_file)
+        # Chunks parsed, waiting to be built
+        parsed = deque()
+        # Chunks being built, in the order of the file
+        futures = deque()
+
+        def write_oldest():
+            errata_chunk = futures.popleft().result()
+            with stage('errata_write'):
+                store.write_errata(errata_chunk, reindex)
+
+        def build_parsed():
+            while parsed:
+                errata_records = parsed.popleft()
+                while len(futures) + len(parsed) >= max_chunks:
+                    write_oldest()
+                futures.append(executor.submit(build_errata_chunk, errata_records, get_chunk_oval_descriptions(store, errata_records)))
+
+        for errata_records in iter_errata_chunks(errata_file, store.batch_size):
+            parsed.append(errata_records)
+            if oval_future is not None:
+                # The chunks are joined with the new OVAL descriptions: the
+                # errata file is parsed meanwhile, until max_chunks are parsed
+                if len(parsed) < max_chunks and not oval_future.done():
+                    continue
+                with stage('oval'):
+                    oval_descriptions, nb_definitions = oval_future.result()
+                    store.set_oval_descriptions(oval_descriptions)
+                del oval_descriptions
+                oval_future = None
+            build_parsed()
+
+        # Errata file shorter than max_chunks
+        if oval_future is not None:
+            with stage('oval'):
+                oval_descriptions, nb_definitions = oval_future.result()
+                store.set_oval_descriptions(oval_descriptions)
+            del oval_descriptions
+        build_parsed()
+        while futures:
+            write_oldest()
+    return nb_definitions
+
+
+def load_feeds(store, errata_file, oval_file, metrics, workers=DEFAULT_WORKERS):
+    """
+    Loads the errata and OVAL feeds into the store, unless they are the ones
+    already loaded, and records the stages and counters in metrics.
+    With several workers, the feeds are parsed concurrently, and the errata
+    built by a pool of workers processes.
+    Returns True if the feeds were loaded.
+    """
+    # Compute the sha1 of the data files
+    with metrics.stage('hash'):
+        logger.info('Computing SHA1 sum of %s', errata_file)
+        errata_file_hash = file_hash(errata_file).hexdigest()
+        logger.debug('SHA1 sum of %s: %s', errata_file, errata_file_hash)
+        logger.info('Computing SHA1 sum of %s', oval_file)
+        oval_file_hash = file_hash(oval_file).hexdigest()
+        logger.debug('SHA1 sum of %s: %s', oval_file, oval_file_hash)
+
+    round_trips = store.round_trips
+    logger.debug('Reading SHA1 sums from the errata store')
+    stored_errata_hash = store.get_value('errata_file_hash')
+    stored_oval_hash = store.get_value('oval_file_hash')
+    logger.debug('Stored SHA1 sums: %s, %s', stored_errata_hash, stored_oval_hash)
+    # Errata stored before the secondary indexes existed have to be indexed
+    reindex = not store.has_indexes()
+
+    if stored_errata_hash == errata_file_hash and stored_oval_hash == oval_file_hash and not reindex:
+        logger.info('SHA1 sums are the same, nothing to do.')
+        metrics.set('store_round_trips', store.round_trips - round_trips)
+        return False
+
+    # The OVAL file changes less often than the errata file: it is only
+    # parsed when changed, and its descriptions are cached in the errata store
+    oval_changed = stored_oval_hash != oval_file_hash
+    if not oval_changed:
+        logger.info('%s unchanged, using the cached OVAL descriptions', oval_file)
+    nb_new, nb_changed, nb_unchanged = store.nb_new, store.nb_changed, store.nb_unchanged
+    if workers > 1:
+        logger.info('Reading %s with %d workers...', errata_file if not oval_changed else '%s and %s' % (oval_file, errata_file), workers)
+        metrics.set('loader_workers', workers)
+        with metrics.stage('errata'):
+            nb_definitions = load_errata_parallel(store, errata_file, oval_file if oval_changed else None, reindex, workers, metrics)
+        if oval_changed:
+            metrics.set('oval_definitions', nb_definitions)
+            logger.info('Done, %d OVAL definitions indexed', nb_definitions)
+    else:
+        if oval_changed:
+            logger.info('Reading %s...', oval_file)
+            with metrics.stage('oval'):
+                nb_definitions = load_oval(store, oval_file)
+            metrics.set('oval_definitions', nb_definitions)
+            logger.info('Done, %d OVAL definitions indexed', nb_definitions)
+
+        # Process errata in XML file
+        # Go through each errata, streaming the file
+        logger.debug('Processing errata file %s...', errata_file)
+        with metrics.stage('errata'):
+            load_errata(store, errata_file, reindex, metrics)
+    if reindex:
+        store.set_indexed()
+    logger.info('Updating hash values in the errata store')
+    store.set_value('errata_file_hash', errata_file_hash)
+    store.set_value('oval_file_hash', oval_file_hash)
+    logger.info('Number of errata created %d', store.nb_new - nb_new)
+    logger.info('Number of errata changed %d', store.nb_changed - nb_changed)
+    logger.info('Number of errata unchanged %d', store.nb_unchanged - nb_unchanged)
+    logger.info('Number of errata store round trips %d', store.round_trips - round_trips)
+    metrics.set('errata_new', store.nb_new - nb_new)
+    metrics.set('errata_changed', store.nb_changed - nb_changed)
+    metrics.set('errata_unchanged', store.nb_unchanged - nb_unchanged)
+    metrics.set('store_round_trips', store.round_trips - round_trips)
+    return True
+
+
+if __name__ == '__main__':
+    print("Errata loader functions for python")
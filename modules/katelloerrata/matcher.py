@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ErrataMatcher(object):
+
+    """
+    Finds, for an errata, the repository it has to be created in and the
+    repository packages it refers to.
+    Repositories are indexed once, so matching an errata costs one dictionary
+    lookup per errata package instead of a scan of every repository.
+    """
+    def __init__(self):
+        # os_release -> repository labels, in the order they were added
+        self.repositories = {}
+        # package filename -> list of (os_release, repository label, package record)
+        self.packages_index = {}
+        # repository label -> set of the errata IDs already in the repository
+        self.repository_erratas = {}
+
+    def add_repository(self, os_release, repository_label, packages, errata_ids):
+        """
+        Indexes a repository.
+        packages is the PackageTable of the repository,
+        errata_ids the IDs of the errata already present in the repository.
+        """
+        self.repositories.setdefault(os_release, []).append(repository_label)
+        self.repository_erratas[repository_label] = set(errata_ids)
+        for filename, record in packages.items():
+            self.packages_index.setdefault(filename, []).append((os_release, repository_label, record))
+
+    def match(self, errata):
+        """
+        Returns a dictionary with the os release, the repository label and the
+        package records matching the errata, or None if the errata doesn't
+        match any repository.
+        The first repository of an os release containing at least one errata
+        package wins. An os release is skipped as soon as one of its
+        repositories, checked in order, already contains the errata.
+        """
+        for os_release, repository_labels in self.repositories.items():
+            errata_packages = errata.get_packages_for_os_release(os_release)
+            if errata_packages is None:
+                continue
+
+            found_packages = {}
+            for errata_package in errata_packages:
+                for package_release, repository_label, record in self.packages_index.get(errata_package, ()):
+                    if package_release == os_release:
+                        found_packages.setdefault(repository_label, []).append(record)
+
+            for repository_label in repository_labels:
+                if errata.errata_id in self.repository_erratas[repository_label]:
+                    logger.debug("Skipping errata %s (already present in %s)", errata.errata_id, repository_label)
+                    break
+                if repository_label in found_packages:
+                    return {
+                        'repository_release': os_release,
+                        'repository_label': repository_label,
+                        'packages': found_packages[repository_label],
+                    }
+        return None
+
+
+if __name__ == '__main__':
+    print("Errata matching classes for python")
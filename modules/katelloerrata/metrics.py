@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+METRICS_PREFIX = 'katelloerrata'
+
+
+class Metrics(object):
+
+    """
+    Stage durations and counters of a run, written as a node_exporter
+    textfile and/or as a JSON report
+    """
+    def __init__(self, job):
+        self.job = job
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a stage. The durations of a stage timed several times add up.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0) + duration
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def observe_api_call(self, api, duration, nb_bytes):
+        """
+        Records an API call to Katello or Pulp
+        """
+        with self.lock:
+            for name, value in (('calls', 1), ('seconds', duration), ('bytes', nb_bytes)):
+                key = '%s_api_%s' % (api, name)
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'job': self.job,
+                'start_time': self.start_time,
+                'duration': time.time() - self.start_time,
+                'stages': dict(self.stages),
+                'counters': dict(self.counters),
+            }
+
+    def write_json(self, file_name):
+        _write_atomic(file_name, json.dumps(self.to_dict(), indent=2, sort_keys=True) + '\n')
+
+    def write_textfile(self, file_name):
+        """
+        Writes the metrics in the Prometheus text format, for the node_exporter
+        textfile collector
+        """
+        data = self.to_dict()
+        lines = [
+            '# HELP %s_stage_duration_seconds Duration of the stages of the last run.' % METRICS_PREFIX,
+            '# TYPE %s_stage_duration_seconds gauge' % METRICS_PREFIX,
+        ]
+        for stage, duration in sorted(data['stages'].items()):
+            lines.append('%s_stage_duration_seconds{job="%s",stage="%s"} %f' % (METRICS_PREFIX, self.job, stage, duration))
+        for name, value in sorted(data['counters'].items()):
+            lines.append('# TYPE %s_%s gauge' % (METRICS_PREFIX, name))
+            lines.append('%s_%s{job="%s"} %s' % (METRICS_PREFIX, name, self.job, value))
+        lines.append('# TYPE %s_last_run_timestamp_seconds gauge' % METRICS_PREFIX)
+        lines.append('%s_last_run_timestamp_seconds{job="%s"} %f' % (METRICS_PREFIX, self.job, data['start_time']))
+        lines.append('# TYPE %s_last_run_duration_seconds gauge' % METRICS_PREFIX)
+        lines.append('%s_last_run_duration_seconds{job="%s"} %f' % (METRICS_PREFIX, self.job, data['duration']))
+        _write_atomic(file_name, '\n'.join(lines) + '\n')
+
+    def write_on_exit(self, textfile=None, json_file=None):
+        """
+        Writes the metrics when the run ends, whatever the way it ends
+        """
+        def write():
+            if textfile is not None:
+                self.write_textfile(textfile)
+            if json_file is not None:
+                self.write_json(json_file)
+        atexit.register(write)
+
+
+def _write_atomic(file_name, content):
+    # node_exporter must never read a partially written file
+    tmp_file_name = file_name + '.tmp'
+    with open(tmp_file_name, 'w') as fh:
+        fh.write(content)
+    os.rename(tmp_file_name, file_name)
+
+
+def enable_profiling(file_name):
+    """
+    Profiles the run with cProfile, and dumps the statistics to file_name on exit
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def dump():
+        profiler.disable()
+        profiler.dump_stats(file_name)
+    atexit.register(dump)
+
+
+def add_arguments(parser):
+    """
+    Adds the logging, metrics and profiling options to an ArgumentParser
+    """
+    parser.add_argument('--debug', action='store_true', help='log at DEBUG level')
+    parser.add_argument('--metrics-textfile', help='write the metrics of the run to this node_exporter textfile (.prom)')
+    parser.add_argument('--metrics-json', help='write the metrics of the run to this JSON file')
+    parser.add_argument('--profile', help='profile the run with cProfile, and dump the statistics to this file')
+
+
+if __name__ == '__main__':
+    print("Metrics classes for python")
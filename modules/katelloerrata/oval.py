@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import re
+
+from .feeds import open_feed
+
+OVAL_NAMESPACE = 'http://oval.mitre.org/XMLSchema/oval-definitions-5'
+OVAL_NAMESPACES = {'o': OVAL_NAMESPACE}
+DEFINITION_TAG = '{%s}definition' % OVAL_NAMESPACE
+
+_cesa_re = re.compile(r'CESA-(\d+):(\d+)')
+
+
+def oval_id_for_errata(errata_id):
+    """
+    Returns the OVAL definition ID matching a CentOS security errata,
+    or None if the errata is not a security one
+    """
+    match_obj = _cesa_re.match(errata_id)
+    if match_obj is None:
+        return None
+    return "oval:com.redhat.rhsa:def:%s%04d" % (match_obj.group(1), int(match_obj.group(2)))
+
+
+class OvalIndex(object):
+
+    """Index of the OVAL definitions metadata, keyed by OVAL definition ID"""
+    def __init__(self):
+        self.definitions = {}
+
+    def load(self, oval_file):
+        """
+        Index all the definitions of an OVAL document, compressed or not, in a
+        single streaming pass. Every child of the definitions, tests, objects
+        and states sections, and every section, is dropped from memory once
+        parsed, so the memory used doesn't depend on the size of the document.
+        """
+        from lxml import etree
+
+        with open_feed(oval_file) as fh:
+            depth = 0
+            for event, elem in etree.iterparse(fh, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                # depth is 1 for the end of a section, 2 for the end of one of its children
+                if depth > 2:
+                    continue
+                if depth == 2 and elem.tag == DEFINITION_TAG:
+                    self.add_definition(elem)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+    def add_definition(self, definition):
+        oval_id = definition.get('id')
+        if oval_id is None:
+            return
+        metadata = definition.find('o:metadata', namespaces=OVAL_NAMESPACES)
+        if metadata is None:
+            return
+        self.definitions[oval_id] = {
+            'title': metadata.findtext('o:title', namespaces=OVAL_NAMESPACES),
+            'description': metadata.findtext('o:description', namespaces=OVAL_NAMESPACES),
+            'severity': metadata.findtext('o:advisory/o:severity', namespaces=OVAL_NAMESPACES),
+            'cves': [cve.text for cve in metadata.iterfind('o:advisory/o:cve', namespaces=OVAL_NAMESPACES)],
+        }
+
+    def get(self, oval_id):
+        return self.definitions.get(oval_id)
+
+    def get_description(self, oval_id):
+        definition = self.definitions.get(oval_id)
+        if definition is None:
+            return None
+        return definition['description']
+
+    def get_severity(self, oval_id):
+        definition = self.definitions.get(oval_id)
+        if definition is None:
+            return None
+        return definition['severity']
+
+    def get_cves(self, oval_id):
+        definition = self.definitions.get(oval_id)
+        if definition is None:
+            return []
+        return definition['cves']
+
+    def get_descriptions(self):
+        """
+        Returns the descriptions of all the definitions, keyed by OVAL definition ID
+        """
+        descriptions = {}
+        for oval_id, definition in self.definitions.items():
+            if definition['description'] is not None:
+                descriptions[oval_id] = definition['description']
+        return descriptions
+
+    def __contains__(self, oval_id):
+        return oval_id in self.definitions
+
+    def __len__(self):
+        return len(self.definitions)
+
+
+if __name__ == '__main__':
+    print("OVAL index classes for python")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+
+# Fields of the repository packages kept for the matching and the advisories
+PACKAGE_FIELDS = ('name', 'epoch', 'version', 'release', 'arch', 'checksum', 'filename')
+
+
+class Package(namedtuple('Package', PACKAGE_FIELDS)):
+
+    """Package of a repository. nvra and nvrea are derived from its fields."""
+    __slots__ = ()
+
+    @property
+    def nvra(self):
+        return '%s-%s-%s.%s' % (self.name, self.version, self.release, self.arch)
+
+    @property
+    def nvrea(self):
+        """
+        NEVRA formatted as the Katello nvrea field: the epoch only appears when not 0
+        """
+        if self.epoch is None or str(self.epoch) == '0':
+            return self.nvra
+        return '%s-%s:%s-%s.%s' % (self.name, self.epoch, self.version, self.release, self.arch)
+
+
+class PackageTable(object):
+
+    """
+    Packages of a repository, keyed by filename. Each package is a Package
+    tuple, and its strings are interned in strings, a dictionary which can
+    be shared by the tables of several repositories: the names, epochs,
+    versions, releases and arches repeated over the packages are stored once.
+    """
+    def __init__(self, strings=None):
+        self.packages = {}
+        self.strings = strings if strings is not None else {}
+
+    def add(self, name, epoch, version, release, arch, checksum, filename):
+        intern = self.strings.setdefault
+        filename = intern(filename, filename)
+        self.packages[filename] = Package(intern(name, name), intern(epoch, epoch), intern(version, version),
+                                          intern(release, release), intern(arch, arch), checksum, filename)
+
+    def add_rpm(self, rpm):
+        """
+        Adds a package from its Katello API representation
+        """
+        self.add(rpm['name'], rpm['epoch'], rpm['version'], rpm['release'], rpm['arch'], rpm['checksum'], rpm['filename'])
+
+    @classmethod
+    def from_rpms(cls, rpms, strings=None):
+        """
+        Returns the table of the packages of an iterable of Katello API
+        representations, consumed as it is iterated
+        """
+        table = cls(strings)
+        for rpm in rpms:
+            table.add_rpm(rpm)
+        return table
+
+    @classmethod
+    def from_rows(cls, rows, strings=None):
+        table = cls(strings)
+        for row in rows:
+            table.add(*row)
+        return table
+
+    def to_rows(self):
+        """
+        Returns the packages as lists of their fields, for the JSON serialization
+        """
+        return [list(package) for package in self.packages.values()]
+
+    def get(self, filename, default=None):
+        return self.packages.get(filename, default)
+
+    def items(self):
+        return self.packages.items()
+
+    def __iter__(self):
+        return iter(self.packages)
+
+    def __contains__(self, filename):
+        return filename in self.packages
+
+    def __len__(self):
+        return len(self.packages)
+
+
+if __name__ == '__main__':
+    print("Repository package table classes for python")
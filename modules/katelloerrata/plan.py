@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .importer import (get_repositories, get_repositories_content, select_errata, count_upload_results,
+                       record_imports, sync_repositories, import_state_label, update_import_state)
+from .katello import Katello
+from .pulp import Pulp, build_advisory
+from .store import open_store
+from .uploader import AdvisoryUploader, DEFAULT_PER_REPOSITORY
+
+PLAN_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def build_plan(store, katello, conf_data, metrics, inventory_cache=None):
+    """
+    Matches the errata of the store with the packages of the configured
+    repositories, and returns the import plan: the advisory of every
+    matching errata, with its repository and its package records.
+    Only reads from Katello and from the store.
+    """
+    with metrics.stage('repositories'):
+        all_repositories = get_repositories(katello, conf_data['repositories'])
+    # The plan doesn't depend on the errata already imported: each target is
+    # checked when the plan is applied
+    with metrics.stage('inventory'):
+        matcher = get_repositories_content(katello, all_repositories, inventory_cache=inventory_cache, errata=False)
+
+    advisories = []
+    with metrics.stage('matching'):
+        for errata in select_errata(store, all_repositories):
+            errata_packages_details = matcher.match(errata)
+            if errata_packages_details is None:
+                continue
+            repository = all_repositories[errata_packages_details['repository_release']][errata_packages_details['repository_label']]
+            advisories.append({
+                'errata_id': errata.errata_id,
+                'digest': errata.get_digest(),
+                'repository_label': errata_packages_details['repository_label'],
+                'advisory': build_advisory(errata, errata_packages_details, repository['checksumType']),
+            })
+    metrics.set('errata_planned', len(advisories))
+
+    repositories = {}
+    for repo_release in all_repositories:
+        for repo in all_repositories[repo_release]:
+            repositories[repo] = {'os_release': repo_release}
+    return {
+        'version': PLAN_VERSION,
+        'created_at': time.time(),
+        'source': katello.katello_server_url,
+        'repositories': repositories,
+        'advisories': advisories,
+    }
+
+
+def write_plan(plan, file_name):
+    """
+    Writes a plan as JSON, compressed if file_name ends with .gz
+    """
+    opener = gzip.open if file_name.endswith('.gz') else open
+    with opener(file_name, 'wt') as fh:
+        json.dump(plan, fh, separators=(',', ':'), sort_keys=True)
+
+
+def read_plan(file_name):
+    opener = gzip.open if file_name.endswith('.gz') else open
+    with opener(file_name, 'rt') as fh:
+        plan = json.load(fh)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError("%s: unsupported plan version %s" % (file_name, plan.get('version')))
+    return plan
+
+
+def get_targets(conf_data):
+    """
+    Returns the configuration of the Katello targets a plan is applied to,
+    keyed by target name. Each entry of the targets section of the
+    configuration file overrides the katello, pulp and repositories sections.
+    Without targets section, the only target is the configured Katello,
+    named None.
+    """
+    if not conf_data.get('targets'):
+        return {None: conf_data}
+    targets = {}
+    for name, conf_target in conf_data['targets'].items():
+        target = dict(conf_data)
+        for section in ('katello', 'pulp', 'repositories'):
+            if section in conf_target:
+                target[section] = conf_target[section]
+        targets[name] = target
+    return targets
+
+
+def apply_plan(plan, target, conf_data, metrics, full=False, dry_run=False, sync=True):
+    """
+    Uploads the advisories of a plan not imported yet in the repositories of
+    a Katello target, records them in the import state of the target and
+    synchronizes the repositories which received errata.
+    With dry_run, only tells what would be uploaded, and writes nothing.
+    Returns a dictionary describing the run: target, planned, skipped,
+    unknown_repository, to_upload, uploaded, failed, timed_out and syncs.
+    """
+    prefix = '%s.' % target if target is not None else ''
+    # The store may not be shared between threads
+    store = open_store(conf_data)
+    katello = Katello({'conf_data': conf_data, 'metrics': metrics})
+    summary = {'target': target, 'planned': len(plan['advisories']), 'skipped': 0, 'unknown_repository': 0, 'to_upload': 0,
+               'uploaded': 0, 'failed': 0, 'timed_out': 0, 'syncs': []}
+
+    with metrics.stage(prefix + 'repositories'):
+        all_repositories = get_repositories(katello, dict((label, conf_repo) for label, conf_repo in conf_data['repositories'].items()
+                                                          if label in plan['repositories']))
+    repositories = {}
+    for repo_release in all_repositories:
+        repositories.update(all_repositories[repo_release])
+
+    # Errata up to date in each repository of the target
+    with metrics.stage(prefix + 'import_state'):
+        up_to_date = {}
+        for repo, repository in repositories.items():
+            state_label = import_state_label(repo, target)
+            imported = store.get_imported(state_label)
+            katello_errata_ids = None
+            if full or not imported:
+                katello_errata_ids = set(errata['errata_id'] for errata in katello.get_repository_erratas(repository['id'])['results'])
+            up_to_date[repo] = update_import_state(store, state_label, imported, katello_errata_ids, write=not dry_run)
+
+    to_upload = []
+    unknown_labels = set()
+    for planned in plan['advisories']:
+        if planned['repository_label'] not in repositories:
+            summary['unknown_repository'] += 1
+            unknown_labels.add(planned['repository_label'])
+            continue
+        if planned['errata_id'] in up_to_date[planned['repository_label']]:
+            summary['skipped'] += 1
+            continue
+        to_upload.append(planned)
+    if unknown_labels:
+        logger.warning('%s: %d errata of repository(ies) %s not configured, ignored', target or 'katello', summary['unknown_repository'],
+                       ', '.join(sorted(unknown_labels)))
+    summary['to_upload'] = len(to_upload)
+    # The counters add up over the targets, the stages are timed per target
+    metrics.incr('errata_skipped', summary['skipped'])
+    metrics.incr('errata_unknown_repository', summary['unknown_repository'])
+    metrics.incr('errata_to_upload', summary['to_upload'])
+
+    if dry_run:
+        for planned in to_upload:
+            logger.info('%s: would upload %s to %s', target or 'katello', planned['errata_id'], planned['repository_label'])
+        return summary
+
+    pulp = Pulp({'conf_data': conf_data, 'metrics': metrics})
+    uploader = AdvisoryUploader(pulp, conf_data['pulp'].get('per_repository', DEFAULT_PER_REPOSITORY))
+    with metrics.stage(prefix + 'upload'):
+        for planned in to_upload:
+            uploader.submit(planned['advisory'], repositories[planned['repository_label']]['pulp'], planned['repository_label'], planned['digest'])
+        upload_results = uploader.results()
+        failed_errata_ids, timed_out_errata_ids = count_upload_results(upload_results, all_repositories)
+        record_imports(store, upload_results, target)
+    summary['failed'] = len(failed_errata_ids)
+    summary['timed_out'] = len(timed_out_errata_ids)
+    summary['uploaded'] = len(to_upload) - summary['failed'] - summary['timed_out']
+    metrics.incr('errata_uploaded', summary['uploaded'])
+    metrics.incr('errata_failed', summary['failed'])
+    metrics.incr('errata_timed_out', summary['timed_out'])
+
+    if sync:
+        with metrics.stage(prefix + 'sync'):
+            summary['syncs'] = sync_repositories(katello, all_repositories)
+    return summary
+
+
+def apply_plan_targets(plan, targets, metrics, full=False, dry_run=False, sync=True):
+    """
+    Applies a plan to several Katello targets concurrently, and returns
+    the list of their apply_plan() results
+    """
+    with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as executor:
+        futures = [executor.submit(apply_plan, plan, target, conf_data, metrics, full, dry_run, sync) for target, conf_data in targets.items()]
+        return [future.result() for future in futures]
+
+
+if __name__ == '__main__':
+    print("Import plan functions for python")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+
+from yaml import load
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    import requests
+except ImportError:
+    print("Please install the python-requests module.")
+    sys.exit(-1)
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from requests.packages.urllib3.util.retry import Retry
+
+DEFAULT_API_URL = '/pulp/api/v3/'
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1
+DEFAULT_TIMEOUT = 300
+DEFAULT_TASK_TIMEOUT = 600
+TASK_FINAL_STATES = ('completed', 'failed', 'canceled', 'skipped')
+
+
+class TaskTimeoutError(Exception):
+
+    """
+    Raised when a Pulp task hasn't reached a final state within task_timeout.
+    The task may still end, task is its last known state.
+    """
+    def __init__(self, task):
+        Exception.__init__(self, "Task %s still %s after the task timeout" % (task['pulp_href'], task['state']))
+        self.task = task
+
+
+def build_advisory(errata, errata_packages_details, checksum_type):
+    """
+    Builds the Pulp 3 advisory document of an errata, for the packages
+    matched in a repository
+    """
+    packages = []
+    for p in errata_packages_details['packages']:
+        packages.append({
+            'name': p.name,
+            'version': p.version,
+            'release': p.release,
+            'epoch': str(p.epoch),
+            'arch': p.arch,
+            'filename': p.filename,
+            'sum': p.checksum,
+            'sum_type': checksum_type,
+            'src': '',
+            'reboot_suggested': False,
+        })
+
+    references = []
+    for ref in errata.get_references():
+        references.append({
+            'href': ref,
+            'ref_id': errata.get_errata_id(),
+            'title': errata.get_synopsis(),
+            'ref_type': errata.get_errata_type(),
+        })
+
+    return {
+        'id': errata.get_errata_id(),
+        'title': errata.get_synopsis(),
+        'description': errata.get_description(),
+        'version': str(errata.get_release()),
+        'release': 'el' + str(errata_packages_details['repository_release']),
+        'type': errata.get_errata_type(),
+        'severity': errata.get_severity(),
+        'status': 'final',
+        'issued_date': errata.get_issue_date(),
+        'updated_date': errata.get_issue_date(),
+        'fromstr': errata.get_email(),
+        'summary': '',
+        'solution': '',
+        'rights': '',
+        'pushcount': '',
+        'reboot_suggested': False,
+        'references': references,
+        'pkglist': [{
+            'name': errata.get_errata_id(),
+            'short': '',
+            'packages': packages,
+        }],
+    }
+
+
+class Pulp(object):
+    """Pulp 3 API class, used to upload advisories"""
+
+    def __init__(self, params):
+        # Read configuration file, unless the configuration is given
+        if params.get('conf_data') is not None:
+            conf_data = params['conf_data']
+        elif params.get('conf_file') is not None:
+            with open(params['conf_file'], 'r') as yaml_file:
+                conf_data = load(yaml_file, Loader=Loader)
+                yaml_file.close()
+
+        self.pulp_server_url = conf_data['pulp']['server']
+        self.pulp_api_url = conf_data['pulp'].get('api_url', DEFAULT_API_URL)
+        self.pulp_api = self.pulp_server_url + self.pulp_api_url
+        self.ssl_verify = conf_data['pulp'].get('ssl_verify', True)
+        self.workers = conf_data['pulp'].get('workers', DEFAULT_WORKERS)
+        self.timeout = conf_data['pulp'].get('timeout', DEFAULT_TIMEOUT)
+        self.task_timeout = conf_data['pulp'].get('task_timeout', DEFAULT_TASK_TIMEOUT)
+        self.retries = conf_data['pulp'].get('retries', DEFAULT_RETRIES)
+        self.backoff = conf_data['pulp'].get('backoff', DEFAULT_BACKOFF)
+        self.repository_hrefs = {}
+
+        if not self.ssl_verify:
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+        # One pooled session for all the API calls. Only the idempotent
+        # requests are retried, never the uploads.
+        retries = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(500, 502, 503, 504),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = self.ssl_verify
+        # Record the API calls in the metrics of the run, if any
+        self.metrics = params.get('metrics')
+        if self.metrics is not None:
+            self.session.hooks['response'].append(self._observe_response)
+        # Authenticate with a client certificate (/etc/foreman/client_cert.pem
+        # on a Katello server) or with a user and a password
+        if 'client_cert' in conf_data['pulp']:
+            self.session.cert = (conf_data['pulp']['client_cert'], conf_data['pulp']['client_key'])
+        if 'username' in conf_data['pulp']:
+            self.session.auth = (conf_data['pulp']['username'], conf_data['pulp']['password'])
+
+    def _url(self, location):
+        # Pulp returns absolute paths for the hrefs
+        if location.startswith('/'):
+            return self.pulp_server_url + location
+        return self.pulp_api + location
+
+    def _observe_response(self, r, *args, **kwargs):
+        self.metrics.observe_api_call('pulp', r.elapsed.total_seconds(), len(r.content))
+
+    def _get_json(self, location, params):
+        """
+        Performs a GET using the passed URL location
+        """
+        r = self.session.get(self._url(location), params=params, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get_repository_href(self, pulp_id):
+        """
+        Returns the href of an RPM repository from its Pulp name
+        (the 'Backend Identifier' of the Katello repository) or its href
+        """
+        if pulp_id.startswith('/'):
+            return pulp_id
+        if pulp_id not in self.repository_hrefs:
+            result = self._get_json('repositories/rpm/rpm/', {'name': pulp_id})
+            if not result['results']:
+                raise LookupError("Pulp repository %s not found" % pulp_id)
+            self.repository_hrefs[pulp_id] = result['results'][0]['pulp_href']
+        return self.repository_hrefs[pulp_id]
+
+    def get_task(self, task_href):
+        return(self._get_json(task_href, None))
+
+    def wait_for_task(self, task_href, poll_interval=1, deadline=None):
+        """
+        Polls a task until it reaches a final state, and returns it.
+        Raises TaskTimeoutError if it is still running after task_timeout,
+        or after deadline if given.
+        """
+        if deadline is None:
+            deadline = time.time() + self.task_timeout
+        while True:
+            task = self.get_task(task_href)
+            if task['state'] in TASK_FINAL_STATES:
+                return task
+            if time.time() > deadline:
+                raise TaskTimeoutError(task)
+            time.sleep(poll_interval)
+
+    def post_advisory(self, advisory, pulp_id):
+        """
+        Uploads an advisory document into a repository, and returns the href
+        of the upload task. The document is sent from memory, as a multipart file.
+        """
+        r = self.session.post(
+            self.pulp_api + 'content/rpm/advisories/',
+            files={'file': (advisory['id'] + '.json', json.dumps(advisory), 'application/json')},
+            data={'repository': self.get_repository_href(pulp_id)},
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        return r.json()['task']
+
+    def upload_advisory(self, advisory, pulp_id):
+        """
+        Uploads an advisory document into a repository, and returns
+        the upload task once finished
+        """
+        return self.wait_for_task(self.post_advisory(advisory, pulp_id))
+
+
+if __name__ == '__main__':
+    print("Pulp API class for python")
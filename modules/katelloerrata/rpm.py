@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import re
+
+from collections import namedtuple
+from functools import lru_cache
+
+_rpm_filename_re = re.compile(r'^(?P<name>.+)-(?:(?P<epoch>\d+):)?(?P<version>[^-:]+)-(?P<release>[^-]+)\.(?P<arch>[^.]+)\.rpm$')
+_dist_re = re.compile(r'\.(?:el|EL|rhel|RHEL)(?P<os_release>\d+)[^.]*')
+
+
+class RpmFilename(namedtuple('RpmFilename', ('name', 'epoch', 'version', 'release', 'arch', 'dist', 'os_release'))):
+
+    """Parsed RPM filename. dist and os_release are None without a dist tag."""
+    __slots__ = ()
+
+    def is_source(self):
+        return self.arch == 'src'
+
+    @property
+    def nvra(self):
+        return '%s-%s-%s.%s' % (self.name, self.version, self.release, self.arch)
+
+
+@lru_cache(maxsize=65536)
+def parse_rpm_filename(filename):
+    """
+    Splits an RPM filename into name, epoch, version, release, arch and
+    dist tag in one pass. Returns None if filename is not an RPM filename.
+    """
+    match_obj = _rpm_filename_re.match(filename)
+    if match_obj is None:
+        return None
+    dist = None
+    os_release = None
+    dist_obj = _dist_re.search('.' + match_obj.group('release'))
+    if dist_obj is not None:
+        dist = dist_obj.group(0)[1:]
+        os_release = int(dist_obj.group('os_release'))
+    return RpmFilename(
+        match_obj.group('name'),
+        match_obj.group('epoch'),
+        match_obj.group('version'),
+        match_obj.group('release'),
+        match_obj.group('arch'),
+        dist,
+        os_release,
+    )
+
+
+if __name__ == '__main__':
+    print("RPM filename parser for python")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import sqlite3
+
+from urllib.request import pathname2url
+
+from .codec import encode_errata, decode_errata
+from .store import ErrataStore, DEFAULT_BATCH_SIZE
+
+DEFAULT_PATH = './data/errata.sqlite'
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+    # changed is set when an errata is written, and cleared once imported
+    'CREATE TABLE IF NOT EXISTS errata (errata_id TEXT PRIMARY KEY, digest TEXT NOT NULL, data BLOB NOT NULL, changed INTEGER NOT NULL DEFAULT 1)',
+    'CREATE INDEX IF NOT EXISTS errata_changed ON errata (changed) WHERE changed = 1',
+    'CREATE TABLE IF NOT EXISTS errata_os_release (os_release INTEGER NOT NULL, errata_id TEXT NOT NULL, PRIMARY KEY (os_release, errata_id)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS errata_os_release_errata_id ON errata_os_release (errata_id)',
+    'CREATE TABLE IF NOT EXISTS errata_package (filename TEXT NOT NULL, errata_id TEXT NOT NULL, PRIMARY KEY (filename, errata_id)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS errata_package_errata_id ON errata_package (errata_id)',
+    'CREATE TABLE IF NOT EXISTS oval_descriptions (oval_id TEXT PRIMARY KEY, description TEXT NOT NULL)',
+    # Import state: errata uploaded to each repository
+    'CREATE TABLE IF NOT EXISTS imported (repository_label TEXT NOT NULL, errata_id TEXT NOT NULL, digest TEXT NOT NULL, imported_at REAL NOT NULL, PRIMARY KEY (repository_label, errata_id)) WITHOUT ROWID',
+)
+
+# Maximum number of bound parameters of a query, on all SQLite versions
+MAX_VARIABLES = 999
+
+
+class SqliteErrataStore(ErrataStore):
+
+    """
+    Errata storage in an embedded SQLite database, for the sites without a
+    Redis server. The secondary indexes are tables, maintained in the same
+    transaction as the errata, so they are always complete.
+    With read_only, the database must exist, and is neither created nor written.
+    """
+    def __init__(self, path=DEFAULT_PATH, batch_size=DEFAULT_BATCH_SIZE, serialization='json', read_only=False):
+        super(SqliteErrataStore, self).__init__(batch_size, serialization)
+        self.path = path
+        if read_only:
+            self.connection = sqlite3.connect('file:%s?mode=ro' % pathname2url(path), uri=True)
+            return
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def _chunks(self, values):
+        chunk_size = min(self.batch_size, MAX_VARIABLES)
+        for i in range(0, len(values), chunk_size):
+            yield values[i:i + chunk_size]
+
+    def get_value(self, key):
+        self.round_trips += 1
+        row = self.connection.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_value(self, key, value):
+        self.round_trips += 1
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
+
+    def has_indexes(self):
+        return True
+
+    def set_indexed(self):
+        pass
+
+    def write_errata(self, erratas, reindex=False):
+        """
+        Writes the errata new or changed since they were stored, comparing
+        their digest with the stored one, and maintains the secondary indexes,
+        in a single transaction. reindex is ignored: the indexes are complete.
+        Returns the lists of the new and of the changed errata IDs.
+        """
+        new_erratas = []
+        changed_erratas = []
+        if not erratas:
+            return new_erratas, changed_erratas
+
+        stored_digests = {}
+        for chunk in self._chunks([errata.errata_id for errata in erratas]):
+            self.round_trips += 1
+            stored_digests.update(self.connection.execute(
+                'SELECT errata_id, digest FROM errata WHERE errata_id IN (%s)' % ','.join('?' * len(chunk)), chunk))
+
+        rows = []
+        os_release_rows = []
+        package_rows = []
+        for errata in erratas:
+            digest = errata.get_digest()
+            stored_digest = stored_digests.get(errata.errata_id)
+            if stored_digest == digest:
+                self.nb_unchanged += 1
+                continue
+            if stored_digest is not None:
+                changed_erratas.append(errata.errata_id)
+            else:
+                new_erratas.append(errata.errata_id)
+            rows.append((errata.errata_id, digest, encode_errata(errata, self.serialization)))
+            os_release_rows.extend((os_release, errata.errata_id) for os_release in errata.os_releases)
+            package_rows.extend((package, errata.errata_id) for package in errata.all_packages)
+
+        self.nb_new += len(new_erratas)
+        self.nb_changed += len(changed_erratas)
+        if not rows:
+            return new_erratas, changed_erratas
+
+        self.round_trips += 1
+        with self.connection:
+            # Remove the changed errata from the indexes of their previous version
+            for chunk in self._chunks(changed_erratas):
+                placeholders = ','.join('?' * len(chunk))
+                self.connection.execute('DELETE FROM errata_os_release WHERE errata_id IN (%s)' % placeholders, chunk)
+                self.connection.execute('DELETE FROM errata_package WHERE errata_id IN (%s)' % placeholders, chunk)
+            self.connection.executemany('INSERT OR REPLACE INTO errata (errata_id, digest, data, changed) VALUES (?, ?, ?, 1)', rows)
+            self.connection.executemany('INSERT OR IGNORE INTO errata_os_release (os_release, errata_id) VALUES (?, ?)', os_release_rows)
+            self.connection.executemany('INSERT OR IGNORE INTO errata_package (filename, errata_id) VALUES (?, ?)', package_rows)
+        return new_erratas, changed_erratas
+
+    def candidate_errata_ids(self, os_release, filenames):
+        """
+        Returns the IDs of the errata of an os release containing at least one
+        of the given package filenames, with a join on a temporary table of
+        the filenames
+        """
+        self.round_trips += 1
+        with self.connection:
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS candidate_filenames (filename TEXT PRIMARY KEY) WITHOUT ROWID')
+            self.connection.execute('DELETE FROM temp.candidate_filenames')
+            self.connection.executemany('INSERT OR IGNORE INTO temp.candidate_filenames (filename) VALUES (?)', ((filename,) for filename in filenames))
+            rows = self.connection.execute(
+                'SELECT DISTINCT p.errata_id FROM temp.candidate_filenames f'
+                ' JOIN errata_package p ON p.filename = f.filename'
+                ' JOIN errata_os_release r ON r.errata_id = p.errata_id AND r.os_release = ?', (int(os_release),)).fetchall()
+            self.connection.execute('DELETE FROM temp.candidate_filenames')
+        return set(row[0] for row in rows)
+
+    def changed_errata_ids(self):
+        self.round_trips += 1
+        return [row[0] for row in self.connection.execute('SELECT errata_id FROM errata WHERE changed = 1 ORDER BY errata_id')]
+
+    def clear_changed(self, errata_ids):
+        self.round_trips += 1
+        with self.connection:
+            self.connection.executemany('UPDATE errata SET changed = 0 WHERE errata_id = ?', ((errata_id,) for errata_id in errata_ids))
+
+    def get_oval_descriptions(self, oval_ids):
+        """
+        Returns the cached descriptions of the given OVAL definition IDs
+        """
+        descriptions = {}
+        for chunk in self._chunks(list(oval_ids)):
+            self.round_trips += 1
+            descriptions.update(self.connection.execute(
+                'SELECT oval_id, description FROM oval_descriptions WHERE oval_id IN (%s)' % ','.join('?' * len(chunk)), chunk))
+        return descriptions
+
+    def set_oval_descriptions(self, descriptions):
+        """
+        Replaces the cached OVAL descriptions, in a single transaction
+        """
+        self.round_trips += 1
+        with self.connection:
+            self.connection.execute('DELETE FROM oval_descriptions')
+            self.connection.executemany('INSERT INTO oval_descriptions (oval_id, description) VALUES (?, ?)', descriptions.items())
+
+    def iter_errata_by_ids(self, errata_ids):
+        """
+        Yields the given errata as katelloErrata objects,
+        fetching them by chunks of batch_size
+        """
+        for chunk in self._chunks(errata_ids):
+            self.round_trips += 1
+            rows = dict(self.connection.execute(
+                'SELECT errata_id, data FROM errata WHERE errata_id IN (%s)' % ','.join('?' * len(chunk)), chunk))
+            for errata_id in chunk:
+                if errata_id in rows:
+                    yield decode_errata(errata_id, rows[errata_id])
+
+    def iter_errata(self, match='CE*'):
+        """
+        Yields the stored errata whose ID matches the glob pattern match,
+        as katelloErrata objects, fetching them by chunks of batch_size
+        """
+        self.round_trips += 1
+        cursor = self.connection.execute('SELECT errata_id, data FROM errata WHERE errata_id GLOB ? ORDER BY errata_id', (match,))
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for errata_id, data in rows:
+                yield decode_errata(errata_id, data)
+
+    def get_digests(self, errata_ids):
+        digests = {}
+        for chunk in self._chunks(list(errata_ids)):
+            self.round_trips += 1
+            digests.update(self.connection.execute(
+                'SELECT errata_id, digest FROM errata WHERE errata_id IN (%s)' % ','.join('?' * len(chunk)), chunk))
+        return digests
+
+    def get_imported(self, repository_label):
+        self.round_trips += 1
+        rows = self.connection.execute('SELECT errata_id, digest, imported_at FROM imported WHERE repository_label = ?', (repository_label,))
+        return dict((errata_id, (digest, imported_at)) for errata_id, digest, imported_at in rows)
+
+    def set_imported(self, repository_label, imported):
+        self.round_trips += 1
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO imported (repository_label, errata_id, digest, imported_at) VALUES (?, ?, ?, ?)',
+                ((repository_label, errata_id, digest, imported_at) for errata_id, (digest, imported_at) in imported.items()))
+
+    def remove_imported(self, repository_label, errata_ids):
+        self.round_trips += 1
+        with self.connection:
+            self.connection.executemany('DELETE FROM imported WHERE repository_label = ? AND errata_id = ?',
+                                        ((repository_label, errata_id) for errata_id in errata_ids))
+
+
+if __name__ == '__main__':
+    print("SQLite errata storage classes for python")
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+import sys
+
+from .codec import encode_errata, decode_errata
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BACKEND = 'redis'
+BACKENDS = ('redis', 'sqlite')
+ERRATA_DIGESTS_KEY = 'errata_digests'
+ERRATA_CHANGED_KEY = 'errata_changed'
+OVAL_DESCRIPTIONS_KEY = 'oval_descriptions'
+# Secondary indexes: sets of errata IDs by os release and by package filename
+INDEXES_KEY = 'errata_indexes'
+OS_RELEASE_INDEX_KEY = 'os_release:%s'
+PACKAGE_INDEX_KEY = 'package:%s'
+# Import state of a repository: digest and import time of the errata uploaded to it
+IMPORTED_KEY = 'imported:%s'
+
+
+class ErrataStore(object):
+
+    """
+    Interface of the errata storages used by the loader and the importer.
+    The errata are stored with the digest of their content, indexed by os
+    release and by package filename, and the ones written since the last
+    import are tracked.
+    """
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, serialization='json'):
+        self.batch_size = batch_size
+        self.serialization = serialization
+        self.round_trips = 0
+        # Errata written by write_errata()
+        self.nb_new = 0
+        self.nb_changed = 0
+        self.nb_unchanged = 0
+
+    def get_value(self, key):
+        raise NotImplementedError
+
+    def set_value(self, key, value):
+        raise NotImplementedError
+
+    def has_indexes(self):
+        """
+        Tells if the secondary indexes cover all the stored errata
+        """
+        raise NotImplementedError
+
+    def set_indexed(self):
+        raise NotImplementedError
+
+    def write_errata(self, erratas, reindex=False):
+        """
+        Writes the errata new or changed since they were stored.
+        Returns the lists of the new and of the changed errata IDs.
+        """
+        raise NotImplementedError
+
+    def candidate_errata_ids(self, os_release, filenames):
+        """
+        Returns the IDs of the errata of an os release containing at least one
+        of the given package filenames
+        """
+        raise NotImplementedError
+
+    def changed_errata_ids(self):
+        """
+        Returns the sorted IDs of the errata written since the last call to clear_changed()
+        """
+        raise NotImplementedError
+
+    def clear_changed(self, errata_ids):
+        raise NotImplementedError
+
+    def get_oval_descriptions(self, oval_ids):
+        raise NotImplementedError
+
+    def set_oval_descriptions(self, descriptions):
+        raise NotImplementedError
+
+    def iter_errata_by_ids(self, errata_ids):
+        raise NotImplementedError
+
+    def iter_errata(self, match='CE*'):
+        raise NotImplementedError
+
+    def get_digests(self, errata_ids):
+        """
+        Returns the digests of the given stored errata, keyed by errata ID
+        """
+        raise NotImplementedError
+
+    def get_imported(self, repository_label):
+        """
+        Returns the import state of a repository: the digest and the import
+        time of the errata uploaded to it, keyed by errata ID
+        """
+        raise NotImplementedError
+
+    def set_imported(self, repository_label, imported):
+        """
+        Records errata as imported in a repository. imported is a dictionary
+        of (digest, import time) keyed by errata ID.
+        """
+        raise NotImplementedError
+
+    def remove_imported(self, repository_label, errata_ids):
+        raise NotImplementedError
+
+
+class RedisErrataStore(ErrataStore):
+
+    """Errata storage in Redis, batching the round trips to the server"""
+    def __init__(self, redis_client, batch_size=DEFAULT_BATCH_SIZE, serialization='json'):
+        super(RedisErrataStore, self).__init__(batch_size, serialization)
+        self.redis_client = redis_client
+
+    def get_value(self, key):
+        self.round_trips += 1
+        value = self.redis_client.get(key)
+        if value is None:
+            return None
+        return value.decode('utf8')
+
+    def set_value(self, key, value):
+        self.round_trips += 1
+        self.redis_client.set(key, value.encode('utf8'))
+
+    def _index_errata(self, pipe, errata_id, os_releases, packages, command):
+        for os_release in os_releases:
+            getattr(pipe, command)(OS_RELEASE_INDEX_KEY % os_release, errata_id)
+        for package in packages:
+            getattr(pipe, command)(PACKAGE_INDEX_KEY % package, errata_id)
+
+    def has_indexes(self):
+        return self.get_value(INDEXES_KEY) is not None
+
+    def set_indexed(self):
+        self.set_value(INDEXES_KEY, '1')
+
+    def write_errata(self, erratas, reindex=False):
+        """
+        Writes the errata new or changed since they were stored, comparing
+        their digest with the stored one, and maintains the secondary indexes.
+        Uses one round trip to read the stored digests, one to read the
+        previous version of the changed errata and one to write.
+        With reindex, the unchanged errata are indexed too.
+        Returns the lists of the new and of the changed errata IDs.
+        """
+        new_erratas = []
+        changed_erratas = []
+        if not erratas:
+            return new_erratas, changed_erratas
+
+        errata_ids = [errata.errata_id for errata in erratas]
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hmget(ERRATA_DIGESTS_KEY, errata_ids)
+        for errata_id in errata_ids:
+            pipe.exists(errata_id)
+        self.round_trips += 1
+        results = pipe.execute()
+        stored_digests = results[0]
+        stored_erratas = results[1:]
+
+        errata_values = {}
+        errata_digests = {}
+        unchanged_erratas = []
+        for errata, stored_digest, exists in zip(erratas, stored_digests, stored_erratas):
+            digest = errata.get_digest()
+            if stored_digest is not None and stored_digest.decode('utf8') == digest:
+                self.nb_unchanged += 1
+                unchanged_erratas.append(errata)
+                continue
+            # Errata stored without a digest are rewritten once, as changed ones
+            if exists:
+                changed_erratas.append(errata.errata_id)
+            else:
+                new_erratas.append(errata.errata_id)
+            errata_values[errata.errata_id] = encode_errata(errata, self.serialization)
+            errata_digests[errata.errata_id] = digest
+
+        self.nb_new += len(new_erratas)
+        self.nb_changed += len(changed_erratas)
+        if not errata_values and not (reindex and unchanged_erratas):
+            return new_erratas, changed_erratas
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        # Remove the changed errata from the indexes of their previous version
+        if changed_erratas:
+            self.round_trips += 1
+            for errata_id, errata_redis_data in zip(changed_erratas, self.redis_client.mget(changed_erratas)):
+                previous_errata = decode_errata(errata_id, errata_redis_data)
+                self._index_errata(pipe, errata_id, previous_errata.os_releases, previous_errata.all_packages, 'srem')
+        if errata_values:
+            pipe.mset(errata_values)
+            pipe.hset(ERRATA_DIGESTS_KEY, mapping=errata_digests)
+            pipe.sadd(ERRATA_CHANGED_KEY, *errata_values)
+        for errata in erratas:
+            if errata.errata_id in errata_values or reindex:
+                self._index_errata(pipe, errata.errata_id, errata.os_releases, errata.all_packages, 'sadd')
+        self.round_trips += 1
+        pipe.execute()
+        return new_erratas, changed_erratas
+
+    def candidate_errata_ids(self, os_release, filenames):
+        """
+        Returns the IDs of the errata of an os release containing at least one
+        of the given package filenames, using one round trip
+        """
+        filenames = list(filenames)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.smembers(OS_RELEASE_INDEX_KEY % os_release)
+        for i in range(0, len(filenames), self.batch_size):
+            pipe.sunion([PACKAGE_INDEX_KEY % filename for filename in filenames[i:i + self.batch_size]])
+        self.round_trips += 1
+        results = pipe.execute()
+        package_errata_ids = set()
+        for errata_ids in results[1:]:
+            package_errata_ids.update(errata_ids)
+        return set(errata_id.decode('utf-8') for errata_id in results[0] & package_errata_ids)
+
+    def changed_errata_ids(self):
+        """
+        Returns the IDs of the errata written since the last call to clear_changed()
+        """
+        self.round_trips += 1
+        return sorted(errata_id.decode('utf-8') for errata_id in self.redis_client.smembers(ERRATA_CHANGED_KEY))
+
+    def clear_changed(self, errata_ids):
+        for i in range(0, len(errata_ids), self.batch_size):
+            self.round_trips += 1
+            self.redis_client.srem(ERRATA_CHANGED_KEY, *errata_ids[i:i + self.batch_size])
+
+    def get_oval_descriptions(self, oval_ids):
+        """
+        Returns the cached descriptions of the given OVAL definition IDs,
+        using a single round trip
+        """
+        if not oval_ids:
+            return {}
+        self.round_trips += 1
+        descriptions = {}
+        for oval_id, description in zip(oval_ids, self.redis_client.hmget(OVAL_DESCRIPTIONS_KEY, oval_ids)):
+            if description is not None:
+                descriptions[oval_id] = description.decode('utf-8')
+        return descriptions
+
+    def set_oval_descriptions(self, descriptions):
+        """
+        Replaces the cached OVAL descriptions, in a single transaction
+        """
+        oval_ids = list(descriptions)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(OVAL_DESCRIPTIONS_KEY)
+        for i in range(0, len(oval_ids), self.batch_size):
+            pipe.hset(OVAL_DESCRIPTIONS_KEY, mapping=dict((oval_id, descriptions[oval_id]) for oval_id in oval_ids[i:i + self.batch_size]))
+        self.round_trips += 1
+        pipe.execute()
+
+    def iter_errata_by_ids(self, errata_ids):
+        """
+        Yields the given errata as katelloErrata objects,
+        fetching them by chunks of batch_size
+        """
+        for i in range(0, len(errata_ids), self.batch_size):
+            chunk = errata_ids[i:i + self.batch_size]
+            self.round_trips += 1
+            for errata_id, errata_redis_data in zip(chunk, self.redis_client.mget(chunk)):
+                if errata_redis_data is None:
+                    continue
+                yield decode_errata(errata_id, errata_redis_data)
+
+    def iter_errata(self, match='CE*'):
+        """
+        Yields the errata stored in Redis as katelloErrata objects.
+        Keys are scanned and fetched by chunks of batch_size, so only
+        one chunk is held in memory at a time.
+        """
+        cursor = 0
+        while True:
+            cursor, errata_ids = self.redis_client.scan(cursor, match=match, count=self.batch_size)
+            self.round_trips += 1
+            if errata_ids:
+                self.round_trips += 1
+                for errata_id, errata_redis_data in zip(errata_ids, self.redis_client.mget(errata_ids)):
+                    # The key may have been removed since the scan
+                    if errata_redis_data is None:
+                        continue
+                    yield decode_errata(errata_id.decode('utf-8'), errata_redis_data)
+            if cursor == 0:
+                break
+
+    def get_digests(self, errata_ids):
+        """
+        Returns the digests of the given stored errata, keyed by errata ID,
+        using one round trip
+        """
+        errata_ids = list(errata_ids)
+        if not errata_ids:
+            return {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for i in range(0, len(errata_ids), self.batch_size):
+            pipe.hmget(ERRATA_DIGESTS_KEY, errata_ids[i:i + self.batch_size])
+        self.round_trips += 1
+        digests = {}
+        for i, chunk_digests in zip(range(0, len(errata_ids), self.batch_size), pipe.execute()):
+            for errata_id, digest in zip(errata_ids[i:i + self.batch_size], chunk_digests):
+                if digest is not None:
+                    digests[errata_id] = digest.decode('utf-8')
+        return digests
+
+    def get_imported(self, repository_label):
+        self.round_trips += 1
+        imported = {}
+        for errata_id, value in self.redis_client.hgetall(IMPORTED_KEY % repository_label).items():
+            digest, imported_at = value.decode('utf-8').split(' ')
+            imported[errata_id.decode('utf-8')] = (digest, float(imported_at))
+        return imported
+
+    def set_imported(self, repository_label, imported):
+        errata_ids = list(imported)
+        if not errata_ids:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for i in range(0, len(errata_ids), self.batch_size):
+            pipe.hset(IMPORTED_KEY % repository_label, mapping=dict(
+                (errata_id, '%s %f' % imported[errata_id]) for errata_id in errata_ids[i:i + self.batch_size]))
+        self.round_trips += 1
+        pipe.execute()
+
+    def remove_imported(self, repository_label, errata_ids):
+        errata_ids = list(errata_ids)
+        if not errata_ids:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for i in range(0, len(errata_ids), self.batch_size):
+            pipe.hdel(IMPORTED_KEY % repository_label, *errata_ids[i:i + self.batch_size])
+        self.round_trips += 1
+        pipe.execute()
+
+
+def open_store(conf_data, read_only=False):
+    """
+    Returns the errata store configured in the store section of the
+    configuration file: Redis by default, or an embedded SQLite database.
+    The settings of the backend are read from the section of the same name.
+    read_only opens the SQLite database read-only; the Redis store is only
+    read by the callers passing it.
+    """
+    backend = (conf_data.get('store') or {}).get('backend', DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError("Unknown errata store backend %s, expected one of %s" % (backend, ', '.join(BACKENDS)))
+    conf_backend = conf_data.get(backend) or {}
+    batch_size = conf_backend.get('batch_size', DEFAULT_BATCH_SIZE)
+    serialization = conf_backend.get('serialization', 'json')
+
+    if backend == 'sqlite':
+        from .sqlite_store import SqliteErrataStore, DEFAULT_PATH
+        return SqliteErrataStore(conf_backend.get('path', DEFAULT_PATH), batch_size, serialization, read_only)
+
+    try:
+        import redis
+    except ImportError:
+        print("Please install the redis module.")
+        sys.exit(-1)
+    redis_client = redis.StrictRedis(host=conf_backend['server'], port=conf_backend['port'], db=0)
+    return RedisErrataStore(redis_client, batch_size, serialization)
+
+
+if __name__ == '__main__':
+    print("Errata storage classes for python")
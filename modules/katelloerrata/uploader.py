@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from requests.packages.urllib3.exceptions import NewConnectionError
+
+from .pulp import TaskTimeoutError
+
+DEFAULT_PER_REPOSITORY = 2
+
+logger = logging.getLogger(__name__)
+
+
+def is_unsent_error(error):
+    """
+    Tells if a failed upload request never reached Pulp, and can be sent
+    again without risking a duplicate upload
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # Also raised when the connection drops once the request is sent
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        # Rejected before being processed
+        return error.response.status_code in (429, 503)
+    return False
+
+
+def is_transient_error(error):
+    """
+    Tells if a failed idempotent request, such as a task poll, is worth retrying
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class AdvisoryUploader(object):
+
+    """
+    Uploads advisories to Pulp with a pool of workers.
+    The number of uploads in flight is capped per repository, the uploads
+    which never reached Pulp and the transient failures of the task polls
+    are retried with an exponential backoff, and the result of every upload
+    is collected.
+    """
+    def __init__(self, pulp, per_repository=DEFAULT_PER_REPOSITORY):
+        self.pulp = pulp
+        self.per_repository = per_repository
+        self.retries = pulp.retries
+        self.backoff = pulp.backoff
+        self.executor = ThreadPoolExecutor(max_workers=pulp.workers)
+        # Limit the queued uploads, so advisories are built at the pace they are uploaded
+        self.queue_slots = threading.BoundedSemaphore(pulp.workers * 2)
+        # The uploads of a repository wait in its queue, not in the pool,
+        # while per_repository of them are in flight
+        self.repository_queues = {}
+        self.repository_uploads = {}
+        self.lock = threading.Lock()
+        self.futures = []
+        # Number of uploads submitted
+        self.submitted = 0
+
+    def _retry_delay(self, attempt):
+        return self.backoff * (2 ** (attempt - 1))
+
+    def _post(self, advisory, pulp_id, result):
+        """
+        Sends the upload request, and returns the href of its task.
+        The request is only sent again if it never reached Pulp: a request
+        which timed out while Pulp was processing it may have created a task.
+        """
+        while True:
+            result['attempts'] += 1
+            try:
+                return self.pulp.post_advisory(advisory, pulp_id)
+            except Exception as e:
+                if is_unsent_error(e) and result['attempts'] <= self.retries:
+                    delay = self._retry_delay(result['attempts'])
+                    logger.debug("Upload of errata %s in %s failed (%s), retrying in %ss", advisory['id'], pulp_id, e, delay)
+                    time.sleep(delay)
+                    continue
+                raise
+
+    def _wait(self, task_href):
+        """
+        Polls the upload task until it ends. Polling is idempotent, so any
+        transient error is retried, within the task timeout.
+        """
+        deadline = time.time() + self.pulp.task_timeout
+        errors = 0
+        while True:
+            try:
+                return self.pulp.wait_for_task(task_href, deadline=deadline)
+            except TaskTimeoutError:
+                raise
+            except Exception as e:
+                errors += 1
+                if is_transient_error(e) and errors <= self.retries:
+                    delay = self._retry_delay(errors)
+                    logger.debug("Polling of task %s failed (%s), retrying in %ss", task_href, e, delay)
+                    time.sleep(delay)
+                    continue
+                raise
+
+    def _upload(self, advisory, pulp_id, repository_label, digest):
+        result = {
+            'errata_id': advisory['id'],
+            'digest': digest,
+            'repository_label': repository_label,
+            'pulp_id': pulp_id,
+            'task': None,
+            'success': False,
+            'timed_out': False,
+            'attempts': 0,
+            'error': None,
+            'finished_at': None,
+        }
+        try:
+            result['task'] = self._post(advisory, pulp_id, result)
+            task = self._wait(result['task'])
+            if task['state'] == 'completed':
+                result['success'] = True
+            else:
+                result['error'] = task.get('error') or 'task %s' % task['state']
+        except TaskTimeoutError as e:
+            # The upload may still succeed: it is neither retried nor recorded as failed
+            result['timed_out'] = True
+            result['error'] = str(e)
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            result['finished_at'] = time.time()
+        return result
+
+    def _run(self, future, advisory, pulp_id, repository_label, digest):
+        try:
+            future.set_result(self._upload(advisory, pulp_id, repository_label, digest))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            # Hand the slot of the repository over to its next upload
+            with self.lock:
+                queue = self.repository_queues[pulp_id]
+                upload = queue.popleft() if queue else None
+                if upload is None:
+                    self.repository_uploads[pulp_id] -= 1
+            if upload is not None:
+                self.executor.submit(self._run, *upload)
+            self.queue_slots.release()
+
+    def submit(self, advisory, pulp_id, repository_label, digest=None):
+        """
+        Queues the upload of an advisory, blocking while the queue is full.
+        digest, the digest of the errata, is passed through to the result.
+        """
+        self.queue_slots.acquire()
+        future = Future()
+        self.futures.append(future)
+        self.submitted += 1
+        upload = (future, advisory, pulp_id, repository_label, digest)
+        with self.lock:
+            if self.repository_uploads.get(pulp_id, 0) >= self.per_repository:
+                self.repository_queues[pulp_id].append(upload)
+                return
+            self.repository_uploads[pulp_id] = self.repository_uploads.get(pulp_id, 0) + 1
+            self.repository_queues.setdefault(pulp_id, deque())
+        self.executor.submit(self._run, *upload)
+
+    def results(self):
+        """
+        Waits for all the queued uploads, and returns their results
+        in submission order
+        """
+        results = [future.result() for future in self.futures]
+        self.executor.shutdown()
+        return results
+
+
+if __name__ == '__main__':
+    print("Advisory upload classes for python")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from katelloerrata.cli import DEFAULT_CONFIG, build_parser
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_config_default(self):
+        self.assertEqual(build_parser().parse_args(['load']).config, DEFAULT_CONFIG)
+
+    def test_config_before_command(self):
+        self.assertEqual(build_parser().parse_args(['--config', 'other.yaml', 'load']).config, 'other.yaml')
+
+    def test_config_after_command(self):
+        # The scripts pass the command first
+        self.assertEqual(build_parser().parse_args(['load', '--config', 'other.yaml']).config, 'other.yaml')
+        self.assertEqual(build_parser().parse_args(['apply', 'plan.json', '-c', 'other.yaml']).config, 'other.yaml')
+
+    def test_config_after_command_wins(self):
+        self.assertEqual(build_parser().parse_args(['-c', 'first.yaml', 'import', '-c', 'second.yaml']).config, 'second.yaml')
+
+
+if __name__ == '__main__':
+    unittest.main()
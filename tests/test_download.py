@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import bz2
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from katelloerrata.bench import FakeFeedHandler, FakeFeedServer
+from katelloerrata.download import ChecksumError, FeedDownloader, STATE_FILE
+
+FEED = b'<opt>\n' + b'<errata/>\n' * 1000 + b'</opt>\n'
+
+
+class TruncatingFeedHandler(FakeFeedHandler):
+
+    """Announces more bytes of the feeds than it sends, then drops the connection"""
+    def do_GET(self):
+        file_name = os.path.join(self.server.directory, os.path.basename(self.path))
+        if not os.path.isfile(file_name) or self.path.endswith('SUMS'):
+            return super(TruncatingFeedHandler, self).do_GET()
+        with open(file_name, 'rb') as fh:
+            body = fh.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:len(body) // 2])
+        self.close_connection = True
+
+
+def read(file_name):
+    with open(file_name, 'rb') as fh:
+        return fh.read()
+
+
+class FeedDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.publish_dir = os.path.join(self.directory, 'publish')
+        self.download_dir = os.path.join(self.directory, 'download')
+        os.mkdir(self.publish_dir)
+        os.mkdir(self.download_dir)
+        self.file_name = os.path.join(self.download_dir, 'errata.latest.xml')
+        self.downloader = FeedDownloader({'retries': 0})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def publish(self, data, compression=None, checksum=None):
+        """
+        Publishes the feed, compressed or not, with the sha1sum of data
+        unless checksum is given
+        """
+        if compression == 'bz2':
+            file_data = bz2.compress(data)
+        elif compression == 'gz':
+            file_data = gzip.compress(data)
+        else:
+            file_data = data
+        base_name = 'errata.latest.xml' + ('.%s' % compression if compression else '')
+        for name in os.listdir(self.publish_dir):
+            os.remove(os.path.join(self.publish_dir, name))
+        with open(os.path.join(self.publish_dir, base_name), 'wb') as fh:
+            fh.write(file_data)
+        with open(os.path.join(self.publish_dir, 'SHA1SUMS'), 'w') as fh:
+            fh.write('%s  errata.latest.xml\n' % (checksum or hashlib.sha1(data).hexdigest()))
+
+    def download(self, server):
+        return self.downloader.download(server.url + '/errata.latest.xml', self.file_name, server.url + '/SHA1SUMS')
+
+    def state(self):
+        return read(os.path.join(self.download_dir, STATE_FILE))
+
+    def assertNoPartialFile(self):
+        self.assertEqual([name for name in os.listdir(self.download_dir) if name.endswith('.part')], [])
+
+    def test_compressed_variant(self):
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            result = self.download(server)
+        self.assertEqual(result['status'], 'downloaded')
+        self.assertEqual(result['file'], self.file_name + '.bz2')
+        self.assertEqual(bz2.decompress(read(self.file_name + '.bz2')), FEED)
+        self.assertIn('"etag"', self.state().decode('utf-8'))
+        self.assertNoPartialFile()
+
+    def test_gz_fallback(self):
+        self.publish(FEED, 'gz')
+        with FakeFeedServer(self.publish_dir) as server:
+            result = self.download(server)
+        self.assertEqual(result['file'], self.file_name + '.gz')
+        self.assertEqual(gzip.decompress(read(self.file_name + '.gz')), FEED)
+
+    def test_uncompressed_fallback(self):
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            self.download(server)
+            # The feed is now only published uncompressed
+            self.publish(FEED + b'<!-- -->\n')
+            result = self.download(server)
+        self.assertEqual(result['file'], self.file_name)
+        self.assertEqual(read(self.file_name), FEED + b'<!-- -->\n')
+        # Only one variant of the feed is kept
+        self.assertFalse(os.path.exists(self.file_name + '.bz2'))
+
+    def test_not_modified(self):
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            self.download(server)
+            state = self.state()
+            mtime = os.stat(self.file_name + '.bz2').st_mtime_ns
+            result = self.download(server)
+        self.assertEqual(result['status'], 'not_modified')
+        self.assertEqual(result['bytes'], 0)
+        self.assertEqual(server.stats['not_modified'], 1)
+        self.assertEqual(os.stat(self.file_name + '.bz2').st_mtime_ns, mtime)
+        self.assertEqual(self.state(), state)
+
+    def test_missing_file_downloaded_again(self):
+        # A validator is only sent for a file still on disk
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            self.download(server)
+            os.remove(self.file_name + '.bz2')
+            result = self.download(server)
+        self.assertEqual(result['status'], 'downloaded')
+        self.assertEqual(server.stats['not_modified'], 0)
+
+    def test_checksum_mismatch_keeps_previous_file(self):
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            self.download(server)
+            state = self.state()
+            self.publish(FEED + b'<!-- -->\n', 'bz2', checksum=hashlib.sha1(FEED).hexdigest())
+            with self.assertRaises(ChecksumError):
+                self.download(server)
+        self.assertEqual(bz2.decompress(read(self.file_name + '.bz2')), FEED)
+        self.assertEqual(self.state(), state)
+        self.assertNoPartialFile()
+
+    def test_truncated_body_keeps_previous_file(self):
+        self.publish(FEED, 'bz2')
+        with FakeFeedServer(self.publish_dir) as server:
+            self.download(server)
+        state = self.state()
+        self.publish(FEED + b'<!-- -->\n', 'bz2')
+        with FakeFeedServer(self.publish_dir, TruncatingFeedHandler) as server:
+            with self.assertRaises((ChecksumError, requests.exceptions.RequestException)):
+                self.download(server)
+        self.assertEqual(bz2.decompress(read(self.file_name + '.bz2')), FEED)
+        self.assertEqual(self.state(), state)
+        self.assertNoPartialFile()
+
+
+if __name__ == '__main__':
+    unittest.main()
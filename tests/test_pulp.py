@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+import email
+import email.policy
+import json
+import socket
+import time
+import unittest
+
+from urllib.parse import urlsplit
+
+from katelloerrata.bench import FakeKatelloHandler, FakeKatelloServer
+from katelloerrata.katelloerrata import katelloErrata
+from katelloerrata.packages import Package
+from katelloerrata.pulp import Pulp, TaskTimeoutError, build_advisory
+from katelloerrata.uploader import AdvisoryUploader
+
+
+class StubPulpHandler(FakeKatelloHandler):
+
+    """
+    Stub of the Pulp API recording the requests it receives. The upload
+    tasks stay running for the first server.running_polls polls, then end
+    in server.task_state. The first uploads answer with the statuses of
+    server.post_failures, 'slow' not answering within server.slow_delay, the
+    others after server.post_delay, and the first server.poll_errors task
+    polls fail.
+    """
+    def do_POST(self):
+        with self.server.lock:
+            failure = self.server.post_failures.pop(0) if self.server.post_failures else None
+        if failure is None:
+            time.sleep(self.server.post_delay)
+            return super(StubPulpHandler, self).do_POST()
+        self._read_body()
+        if failure == 'slow':
+            # The client gave up waiting
+            time.sleep(self.server.slow_delay)
+            self.close_connection = True
+            return
+        self._send_json({'detail': 'unavailable'}, failure)
+
+    def _read_body(self):
+        body = super(StubPulpHandler, self)._read_body()
+        with self.server.lock:
+            self.server.requests.append({'method': self.command, 'path': self.path, 'headers': dict(self.headers), 'body': body})
+        return body
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith('/pulp/api/v3/tasks/'):
+            return super(StubPulpHandler, self).do_GET()
+        self._read_body()
+        with self.server.lock:
+            self.server.task_polls += 1
+            polls = self.server.task_polls
+            if self.server.poll_errors:
+                self.server.poll_errors -= 1
+                return self._send_json({'detail': 'error'}, 500)
+        if polls <= self.server.running_polls:
+            return self._send_json({'pulp_href': url.path, 'state': 'running', 'error': None})
+        if self.server.task_state == 'failed':
+            return self._send_json({'pulp_href': url.path, 'state': 'failed', 'error': {'description': 'Invalid advisory'}})
+        return self._send_json({'pulp_href': url.path, 'state': self.server.task_state, 'error': None})
+
+
+class StubPulpServer(FakeKatelloServer):
+
+    def __init__(self, task_state='completed', running_polls=0, post_failures=(), poll_errors=0, slow_delay=1, post_delay=0):
+        super(StubPulpServer, self).__init__({}, StubPulpHandler)
+        self.httpd.requests = []
+        self.httpd.task_polls = 0
+        self.httpd.running_polls = running_polls
+        self.httpd.task_state = task_state
+        self.httpd.post_failures = list(post_failures)
+        self.httpd.poll_errors = poll_errors
+        self.httpd.slow_delay = slow_delay
+        self.httpd.post_delay = post_delay
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+
+def make_errata():
+    errata = katelloErrata('CESA-2020:1234')
+    errata.set_synopsis('Important: bash security update')
+    errata.set_description('Bash is the GNU shell.')
+    errata.set_issue_date('2020-01-02 03:04:05')
+    errata.set_release('1')
+    errata.set_email('centos-announce@centos.org')
+    errata.set_severity('Important')
+    errata.set_errata_type('Security Advisory')
+    errata.add_reference('https://lists.centos.org/pipermail/centos-announce/2020-January/000001.html')
+    errata.add_os_release(7)
+    errata.add_package('bash-4.2.46-34.el7.x86_64.rpm')
+    errata.add_package('bash-4.2.46-34.el7.src.rpm')
+    return errata
+
+
+def make_details():
+    return {
+        'repository_release': 7,
+        'repository_label': 'centos-7-updates',
+        'packages': [Package('bash', 0, '4.2.46', '34.el7', 'x86_64', 'a' * 64, 'bash-4.2.46-34.el7.x86_64.rpm')],
+    }
+
+
+def make_pulp(server, **conf_pulp):
+    conf_pulp.update({'server': server.url, 'ssl_verify': False, 'workers': 2, 'retries': 2, 'backoff': 0})
+    return Pulp({'conf_data': {'pulp': conf_pulp}})
+
+
+def parse_multipart(request):
+    """
+    Returns the parts of a multipart/form-data request body, keyed by field name
+    """
+    message = email.message_from_bytes(b'Content-Type: ' + request['headers']['Content-Type'].encode('ascii') + b'\r\n\r\n' + request['body'],
+                                       policy=email.policy.HTTP)
+    parts = {}
+    for part in message.iter_parts():
+        parts[part.get_param('name', header='content-disposition')] = part
+    return parts
+
+
+class BuildAdvisoryTest(unittest.TestCase):
+
+    def test_advisory(self):
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        self.assertEqual(advisory['id'], 'CESA-2020:1234')
+        self.assertEqual(advisory['type'], 'security')
+        self.assertEqual(advisory['severity'], 'Important')
+        self.assertEqual(advisory['release'], 'el7')
+        self.assertEqual(advisory['version'], '1')
+        self.assertEqual(advisory['issued_date'], '2020-01-02 03:04:05')
+        self.assertEqual(advisory['references'], [{
+            'href': 'https://lists.centos.org/pipermail/centos-announce/2020-January/000001.html',
+            'ref_id': 'CESA-2020:1234',
+            'title': 'Important: bash security update',
+            'ref_type': 'security',
+        }])
+        self.assertEqual(len(advisory['pkglist']), 1)
+        self.assertEqual(advisory['pkglist'][0]['packages'], [{
+            'name': 'bash',
+            'version': '4.2.46',
+            'release': '34.el7',
+            'epoch': '0',
+            'arch': 'x86_64',
+            'filename': 'bash-4.2.46-34.el7.x86_64.rpm',
+            'sum': 'a' * 64,
+            'sum_type': 'sha256',
+            'src': '',
+            'reboot_suggested': False,
+        }])
+        # The advisory is sent as JSON
+        json.dumps(advisory)
+
+
+class UploadAdvisoryTest(unittest.TestCase):
+
+    def test_upload(self):
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        with StubPulpServer() as server:
+            pulp = make_pulp(server)
+            task = pulp.upload_advisory(advisory, 'centos-7-updates')
+        self.assertEqual(task['state'], 'completed')
+
+        uploads = [request for request in server.requests if request['method'] == 'POST']
+        self.assertEqual(len(uploads), 1)
+        self.assertEqual(urlsplit(uploads[0]['path']).path, '/pulp/api/v3/content/rpm/advisories/')
+        parts = parse_multipart(uploads[0])
+        self.assertEqual(parts['file'].get_filename(), 'CESA-2020:1234.json')
+        self.assertEqual(parts['file'].get_content_type(), 'application/json')
+        self.assertEqual(json.loads(parts['file'].get_payload(decode=True).decode('utf-8')), advisory)
+        self.assertEqual(parts['repository'].get_payload(decode=True).decode('utf-8'), '/pulp/api/v3/repositories/rpm/rpm/centos-7-updates/')
+
+    def test_repository_href_lookup(self):
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        with StubPulpServer() as server:
+            pulp = make_pulp(server)
+            pulp.upload_advisory(advisory, 'centos-7-updates')
+            pulp.upload_advisory(advisory, 'centos-7-updates')
+            # An href is used as is
+            pulp.upload_advisory(advisory, '/pulp/api/v3/repositories/rpm/rpm/other/')
+        lookups = [urlsplit(request['path']) for request in server.requests
+                   if urlsplit(request['path']).path == '/pulp/api/v3/repositories/rpm/rpm/']
+        # The href of a repository is looked up once
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(lookups[0].query, 'name=centos-7-updates')
+        repositories = [parse_multipart(request)['repository'].get_payload(decode=True).decode('utf-8')
+                        for request in server.requests if request['method'] == 'POST']
+        self.assertEqual(repositories, ['/pulp/api/v3/repositories/rpm/rpm/centos-7-updates/'] * 2 +
+                                       ['/pulp/api/v3/repositories/rpm/rpm/other/'])
+
+    def test_task_polling(self):
+        with StubPulpServer(running_polls=2) as server:
+            pulp = make_pulp(server)
+            task = pulp.wait_for_task('/pulp/api/v3/tasks/1/', poll_interval=0.01)
+        self.assertEqual(task['state'], 'completed')
+        self.assertEqual(server.httpd.task_polls, 3)
+
+    def test_failed_task(self):
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        with StubPulpServer(task_state='failed') as server:
+            pulp = make_pulp(server)
+            task = pulp.upload_advisory(advisory, 'centos-7-updates')
+            self.assertEqual(task['state'], 'failed')
+
+            uploader = AdvisoryUploader(pulp)
+            uploader.submit(advisory, 'centos-7-updates', 'centos-7-updates', 'digest')
+            results = uploader.results()
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0]['success'])
+        self.assertEqual(results[0]['error'], {'description': 'Invalid advisory'})
+        # A failed task is not retried
+        self.assertEqual(results[0]['attempts'], 1)
+        self.assertEqual(results[0]['digest'], 'digest')
+
+    def upload(self, server, **conf_pulp):
+        uploader = AdvisoryUploader(make_pulp(server, **conf_pulp))
+        uploader.submit(build_advisory(make_errata(), make_details(), 'sha256'), 'centos-7-updates', 'centos-7-updates', 'digest')
+        return uploader.results()[0]
+
+    def test_rejected_upload_retried(self):
+        with StubPulpServer(post_failures=[503]) as server:
+            result = self.upload(server)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['attempts'], 2)
+        self.assertEqual(len([request for request in server.requests if request['method'] == 'POST']), 2)
+
+    def test_read_timeout_not_retried(self):
+        # Pulp may have created the task of an upload whose response timed out
+        with StubPulpServer(post_failures=['slow'], slow_delay=0.5) as server:
+            result = self.upload(server, timeout=0.1)
+        self.assertFalse(result['success'])
+        self.assertFalse(result['timed_out'])
+        self.assertEqual(result['attempts'], 1)
+        self.assertEqual(len([request for request in server.requests if request['method'] == 'POST']), 1)
+
+    def test_connection_refused_retried(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        pulp = Pulp({'conf_data': {'pulp': {'server': 'http://127.0.0.1:%d' % port, 'retries': 2, 'backoff': 0}}})
+        uploader = AdvisoryUploader(pulp)
+        uploader.submit(build_advisory(make_errata(), make_details(), 'sha256'), '/pulp/api/v3/repositories/rpm/rpm/centos-7-updates/',
+                        'centos-7-updates', 'digest')
+        result = uploader.results()[0]
+        self.assertFalse(result['success'])
+        self.assertEqual(result['attempts'], 3)
+
+    def test_task_poll_retried(self):
+        # The session retries the polls twice, the uploader retries them again
+        with StubPulpServer(poll_errors=4) as server:
+            result = self.upload(server)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['attempts'], 1)
+        self.assertEqual(result['task'], '/pulp/api/v3/tasks/1/')
+        self.assertEqual(server.httpd.task_polls, 5)
+
+    def test_repositories_spread(self):
+        # An upload of another repository doesn't wait behind the uploads
+        # of a repository at its per_repository limit
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        with StubPulpServer(post_delay=0.2) as server:
+            uploader = AdvisoryUploader(make_pulp(server), per_repository=1)
+            for pulp_id in ('/repositories/a/', '/repositories/a/', '/repositories/a/', '/repositories/b/'):
+                uploader.submit(advisory, pulp_id, pulp_id)
+            results = uploader.results()
+        self.assertEqual(uploader.submitted, 4)
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual([result['pulp_id'] for result in results], ['/repositories/a/'] * 3 + ['/repositories/b/'])
+        repositories = [parse_multipart(request)['repository'].get_payload(decode=True).decode('utf-8')
+                        for request in server.requests if request['method'] == 'POST']
+        self.assertEqual(sorted(repositories[:2]), ['/repositories/a/', '/repositories/b/'])
+
+    def test_task_timeout(self):
+        advisory = build_advisory(make_errata(), make_details(), 'sha256')
+        with StubPulpServer(running_polls=100) as server:
+            pulp = make_pulp(server, task_timeout=0)
+            with self.assertRaises(TaskTimeoutError) as raised:
+                pulp.wait_for_task('/pulp/api/v3/tasks/1/', poll_interval=0.01)
+            self.assertEqual(raised.exception.task['state'], 'running')
+
+            uploader = AdvisoryUploader(pulp)
+            uploader.submit(advisory, 'centos-7-updates', 'centos-7-updates', 'digest')
+            results = uploader.results()
+        # An upload still running is neither a success nor a failure
+        self.assertFalse(results[0]['success'])
+        self.assertTrue(results[0]['timed_out'])
+        self.assertIn('still running', results[0]['error'])
+        self.assertEqual(results[0]['attempts'], 1)
+
+    def test_skipped_task(self):
+        with StubPulpServer(task_state='skipped') as server:
+            pulp = make_pulp(server)
+            task = pulp.wait_for_task('/pulp/api/v3/tasks/1/', poll_interval=0.01)
+        self.assertEqual(task['state'], 'skipped')
+        self.assertEqual(server.httpd.task_polls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()